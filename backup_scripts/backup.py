@@ -0,0 +1,255 @@
+"""Online, incremental backups of the game server
+
+The database is copied with SQLite's online backup API in a single step
+from one read snapshot; the server runs in WAL mode, so players keep
+playing while it runs. The copy is then checked and gzipped.
+Media files are stored once per content hash: a run only copies files
+that are new or changed since the last one. Every run writes a manifest
+that is enough on its own to restore the server as it was at that time.
+
+Layout of the target directory:
+    db/<sha256>.db.gz        compressed database snapshots
+    objects/<ab>/<sha256>    media, by content hash
+    manifests/<stamp>.json   one per run, newest sorts last
+
+Usage:
+    python backup_scripts/backup.py backup --target /mnt/backup
+    python backup_scripts/backup.py list --target /mnt/backup
+    python backup_scripts/backup.py restore --target /mnt/backup --dest ~/server [--at 2026-10-18T12:00]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATABASE = os.path.join('server_scripts', 'app.db')
+# Everything users upload or that is expensive to rebuild, relative to ROOT
+MEDIA_DIRS = (
+    os.path.join('static', 'media'),
+    os.path.join('static', 'uploads'),
+    os.path.join('static', 'profile_pictures'),
+    os.path.join('static', 'profiles'),
+    os.path.join('static', 'generated_levels'),
+)
+CHUNK_SIZE = 1024 * 1024
+
+
+class Stats:
+    """Bytes and files moved by one run"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.files_copied = 0
+        self.files_reused = 0
+        self.db_seconds = 0.0
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        return {
+            'duration_s': round(elapsed, 3),
+            'db_snapshot_s': round(self.db_seconds, 3),
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'files_copied': self.files_copied,
+            'files_reused': self.files_reused,
+            'throughput_mb_s': round(self.bytes_read / elapsed / 1e6, 2) if elapsed else 0.0,
+        }
+
+
+def file_sha256(path, stats=None):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            if stats:
+                stats.bytes_read += len(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_database(source, target, stats):
+    """Copy a live database to target/db/ and return its manifest entry
+
+    The copy is one backup step, which only holds a WAL read snapshot:
+    writers are never blocked. A copy in several steps would start over
+    each time a write landed between two steps, and may never finish on a
+    busy server. A snapshot identical to a stored one is not written again.
+    """
+    start = time.perf_counter()
+    fd, snapshot = tempfile.mkstemp(dir=target, suffix='.db')
+    os.close(fd)
+    try:
+        src = sqlite3.connect(source)
+        dst = sqlite3.connect(snapshot)
+        try:
+            src.backup(dst, pages=-1)
+            if dst.execute('PRAGMA quick_check').fetchone()[0] != 'ok':
+                raise RuntimeError(f'Snapshot of {source} failed its integrity check')
+        finally:
+            dst.close()
+            src.close()
+        stats.db_seconds = time.perf_counter() - start
+        size = os.path.getsize(snapshot)
+        digest = file_sha256(snapshot, stats)
+        name = os.path.join('db', f'{digest}.db.gz')
+        dest = os.path.join(target, name)
+        if not os.path.exists(dest):
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            with open(snapshot, 'rb') as f, gzip.open(dest + '.tmp', 'wb', compresslevel=6) as out:
+                shutil.copyfileobj(f, out, CHUNK_SIZE)
+            os.replace(dest + '.tmp', dest)
+            stats.bytes_written += os.path.getsize(dest)
+        return {'path': DATABASE, 'file': name, 'sha256': digest, 'size': size,
+                'compressed_size': os.path.getsize(dest)}
+    finally:
+        os.remove(snapshot)
+
+
+def object_path(target, digest):
+    return os.path.join(target, 'objects', digest[:2], digest)
+
+
+def backup_media(root, target, previous, stats):
+    """Store new or changed media files and return {relpath: entry}
+
+    Files whose size and mtime match the previous manifest are trusted
+    to be unchanged and are not read at all.
+    """
+    files = {}
+    for media_dir in MEDIA_DIRS:
+        for dirpath, _, filenames in os.walk(os.path.join(root, media_dir)):
+            for filename in filenames:
+                if filename.endswith(('.tmp', '.upload')):
+                    continue  # Half-written by the server
+                path = os.path.join(dirpath, filename)
+                rel = os.path.relpath(path, root).replace(os.sep, '/')
+                try:
+                    st = os.stat(path)
+                    old = previous.get(rel)
+                    if old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns \
+                            and os.path.exists(object_path(target, old['sha256'])):
+                        files[rel] = old
+                        stats.files_reused += 1
+                        continue
+                    digest = file_sha256(path, stats)
+                    dest = object_path(target, digest)
+                    if os.path.exists(dest):
+                        stats.files_reused += 1
+                    else:
+                        os.makedirs(os.path.dirname(dest), exist_ok=True)
+                        shutil.copyfile(path, dest + '.tmp')
+                        os.replace(dest + '.tmp', dest)
+                        stats.bytes_written += st.st_size
+                        stats.files_copied += 1
+                except FileNotFoundError:
+                    continue  # Deleted while we were walking
+                files[rel] = {'sha256': digest, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    return files
+
+
+def manifests(target):
+    folder = os.path.join(target, 'manifests')
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name for name in os.listdir(folder) if name.endswith('.json'))
+
+
+def load_manifest(target, name):
+    with open(os.path.join(target, 'manifests', name)) as f:
+        return json.load(f)
+
+
+def backup(root, target):
+    """Run one backup of root into target and return its manifest"""
+    os.makedirs(os.path.join(target, 'manifests'), exist_ok=True)
+    stats = Stats()
+    existing = manifests(target)
+    previous = load_manifest(target, existing[-1])['files'] if existing else {}
+    created = datetime.now(timezone.utc)
+    manifest = {
+        'created': created.isoformat(timespec='seconds'),
+        'database': snapshot_database(os.path.join(root, DATABASE), target, stats),
+        'files': backup_media(root, target, previous, stats),
+    }
+    manifest['stats'] = stats.report()
+    name = created.strftime('%Y%m%dT%H%M%S%fZ') + '.json'
+    path = os.path.join(target, 'manifests', name)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+    return manifest
+
+
+def pick_manifest(target, at=None):
+    """Newest manifest, or the newest one taken at or before `at` (ISO time, UTC)"""
+    names = manifests(target)
+    if at:
+        cutoff = datetime.fromisoformat(at)
+        if cutoff.tzinfo is None:
+            cutoff = cutoff.replace(tzinfo=timezone.utc)
+        names = [n for n in names
+                 if datetime.strptime(n[:-5], '%Y%m%dT%H%M%S%fZ').replace(tzinfo=timezone.utc) <= cutoff]
+    if not names:
+        raise SystemExit('No backup matches')
+    return names[-1]
+
+
+def restore(target, dest, name):
+    """Rebuild the database and media of one manifest under dest"""
+    manifest = load_manifest(target, name)
+    db = manifest['database']
+    db_path = os.path.join(dest, db['path'])
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    with gzip.open(os.path.join(target, db['file']), 'rb') as f, open(db_path + '.tmp', 'wb') as out:
+        shutil.copyfileobj(f, out, CHUNK_SIZE)
+    os.replace(db_path + '.tmp', db_path)
+    for rel, entry in manifest['files'].items():
+        path = os.path.join(dest, *rel.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(object_path(target, entry['sha256']), path)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Online incremental backups of the game server')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('backup', help='take a backup now')
+    run.add_argument('--root', default=ROOT, help='server checkout to back up')
+    run.add_argument('--target', required=True, help='local or mounted backup directory')
+    listing = sub.add_parser('list', help='list the backups in a target')
+    listing.add_argument('--target', required=True)
+    back = sub.add_parser('restore', help='restore a backup into a directory')
+    back.add_argument('--target', required=True)
+    back.add_argument('--dest', required=True, help='where to write the restored server files')
+    back.add_argument('--at', help='restore the last backup taken at or before this ISO time (UTC)')
+    args = parser.parse_args()
+
+    if args.command == 'backup':
+        manifest = backup(os.path.abspath(args.root), os.path.abspath(args.target))
+        s = manifest['stats']
+        print(f"Backup done in {s['duration_s']}s (database {s['db_snapshot_s']}s): "
+              f"{s['bytes_read'] / 1e6:.1f}MB read at {s['throughput_mb_s']}MB/s, "
+              f"{s['bytes_written'] / 1e6:.1f}MB written, "
+              f"{s['files_copied']} files copied, {s['files_reused']} unchanged")
+    elif args.command == 'list':
+        for name in manifests(args.target):
+            manifest = load_manifest(args.target, name)
+            print(f"{manifest['created']}  {len(manifest['files'])} files  "
+                  f"db {manifest['database']['size'] / 1e6:.1f}MB  ({name})")
+    else:
+        name = pick_manifest(args.target, args.at)
+        manifest = restore(args.target, args.dest, name)
+        print(f"Restored backup of {manifest['created']} into {args.dest}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,11 @@
 #!/bin/bash
+# Runs on the backup machine: have the server take an online backup, then fetch it
 
 backup_machine_ssh="<ssh_key>"
 machine_username="<username>"
 backup_ip="<ip_backup_server>"
 
-scp -i $backup_machine_ssh -p -r $machine_username@$backup_ip:~/server ~/backup/saves
\ No newline at end of file
+ssh -i $backup_machine_ssh $machine_username@$backup_ip \
+    "python3 ~/server/backup_scripts/backup.py backup --root ~/server --target ~/backup/saves" || exit 1
+# Snapshots and objects are named by content hash: only new ones are fetched
+rsync -a --ignore-existing -e "ssh -i $backup_machine_ssh" $machine_username@$backup_ip:~/backup/saves/ ~/backup/saves
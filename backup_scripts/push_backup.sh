@@ -1,7 +1,11 @@
 #!/bin/bash
+# Runs on the game server: take an online backup, then ship the new objects
 
 backup_machine_ssh="<ssh_key>"
 machine_username="<username>"
 backup_ip="<ip_backup_server>"
+backup_target=~/backup/saves
 
-scp -i $backup_machine_ssh -r ~/backup/saves/server $machine_username@$backup_ip:/home/$machine_username/
\ No newline at end of file
+python3 ~/server/backup_scripts/backup.py backup --root ~/server --target $backup_target || exit 1
+# Snapshots and objects are named by content hash: only new ones are sent
+rsync -a --ignore-existing -e "ssh -i $backup_machine_ssh" $backup_target/ $machine_username@$backup_ip:/home/$machine_username/saves/
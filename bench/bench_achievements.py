@@ -0,0 +1,125 @@
+"""Throughput of the achievements engine as the rule count grows
+
+Feeds the same random stream of game events to engines compiled with
+more and more rules, and to a naive evaluator that checks every rule on
+every event. Extra rules are split between more thresholds on the real
+counters and counters on event types the stream never produces, which
+is how the rule set grows in practice.
+
+Usage: python bench/bench_achievements.py [--events 200000] [--users 1000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server_scripts')))
+
+from achievements import COUNTERS, RULES, AchievementEngine, Counter, Rule, create_achievement_tables
+
+RULE_COUNTS = (13, 100, 1000, 10000)
+
+
+def build_rules(total):
+    counters = list(COUNTERS)
+    rules = list(RULES)
+    rng = random.Random(total)
+    extra = total - len(rules)
+    for i in range(extra):
+        if i % 2:
+            counter = rng.choice(COUNTERS)
+            rules.append(Rule(f'tier_{i}', '', counter.name, rng.randrange(1, 10 ** 7)))
+        else:
+            name = f'custom_{i}'
+            counters.append(Counter(name, f'custom_event_{i % 97}', 'count', None, ()))
+            rules.append(Rule(f'custom_{i}', '', name, rng.randrange(1, 100)))
+    return counters, rules
+
+
+def make_events(n, users):
+    rng = random.Random(42)
+    events = []
+    for _ in range(n):
+        user = rng.randrange(1, users + 1)
+        roll = rng.random()
+        if roll < 0.8:
+            events.append((user, 'boss_damage', {'damage': 50, 'world_boss': rng.random() < 0.5}))
+        elif roll < 0.9:
+            events.append((user, 'boss_defeated', {'world_boss': rng.random() < 0.1}))
+        elif roll < 0.98:
+            events.append((user, 'player_death', {}))
+        else:
+            events.append((user, 'difficulty_set', {'difficulty': rng.choice((1, 2, 5, 10))}))
+    return events
+
+
+class NaiveEvaluator:
+    """Checks every rule against every event: what the engine avoids"""
+
+    def __init__(self, counters, rules):
+        self.counters = {c.name: c for c in counters}
+        self.rules = rules
+        self.values = {}
+        self.badges = set()
+
+    def record(self, user_id, event, fields):
+        seen = set()
+        for rule in self.rules:
+            c = self.counters[rule.counter]
+            if c.event != event or any(fields.get(k) != v for k, v in c.where):
+                continue
+            key = (user_id, c.name)
+            if c.name not in seen:
+                seen.add(c.name)
+                if c.op == 'count':
+                    self.values[key] = self.values.get(key, 0) + 1
+                elif c.op == 'sum':
+                    self.values[key] = self.values.get(key, 0) + int(fields.get(c.field) or 0)
+                else:
+                    self.values[key] = max(self.values.get(key, 0), int(fields.get(c.field) or 0))
+            if self.values[key] >= rule.threshold:
+                self.badges.add((user_id, rule.badge))
+
+
+def run_engine(counters, rules, events, users):
+    conn = sqlite3.connect(':memory:', check_same_thread=False)
+    create_achievement_tables(conn.cursor())
+    engine = AchievementEngine(counters, rules, persist_interval=float('inf'))
+    get_db = lambda: conn
+    for user in range(1, users + 1):  # Load everyone first: measure the steady state
+        engine.record(get_db, user, 'player_death')
+    start = time.perf_counter()
+    for user, event, fields in events:
+        engine.record(get_db, user, event, **fields)
+    elapsed = time.perf_counter() - start
+    persist_start = time.perf_counter()
+    rows, badges = engine.persist(conn)
+    return elapsed, time.perf_counter() - persist_start, rows, badges
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--naive-events', type=int, default=20000, help='events fed to the naive evaluator')
+    args = parser.parse_args()
+
+    events = make_events(args.events, args.users)
+    print(f"{'rules':>8}{'engine ev/s':>14}{'naive ev/s':>14}{'persist ms':>12}{'rows':>8}{'badges':>8}")
+    for total in RULE_COUNTS:
+        counters, rules = build_rules(total)
+        elapsed, persist, rows, badges = run_engine(counters, rules, events, args.users)
+        naive = NaiveEvaluator(counters, rules)
+        sample = events[:args.naive_events]
+        start = time.perf_counter()
+        for user, event, fields in sample:
+            naive.record(user, event, fields)
+        naive_rate = len(sample) / (time.perf_counter() - start)
+        print(f'{total:>8}{len(events) / elapsed:>14,.0f}{naive_rate:>14,.0f}'
+              f'{persist * 1000:>12.1f}{rows:>8}{badges:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Fan-out benchmark for the world boss SSE stream
+
+Opens many simulated subscribers on a BossStream, publishes HP updates at
+a fixed rate and reports delivery latency and how many updates were
+coalesced away.
+
+Usage: python bench/bench_boss_stream.py [--subscribers 1000] [--updates 200] [--rate 100]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server_scripts')))
+
+from boss_stream import BossStream
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=1000)
+    parser.add_argument('--updates', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=100.0, help='updates per second')
+    args = parser.parse_args()
+
+    state = {'boss': (1, 100000, False)}
+    stream = BossStream(lambda: state['boss'], interval=0.05)
+    published_at = {}
+    latencies = []
+    received = [0] * args.subscribers
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def subscriber(i):
+        for frame in stream.subscribe():
+            if done.is_set():
+                break
+            if not frame.startswith('id:'):
+                continue
+            data = json.loads(frame.split('data: ', 1)[1])
+            lag = time.perf_counter() - published_at.get(data['health'], time.perf_counter())
+            received[i] += 1
+            with lock:
+                latencies.append(lag)
+
+    threads = [threading.Thread(target=subscriber, args=(i,), daemon=True) for i in range(args.subscribers)]
+    for t in threads:
+        t.start()
+    while stream.stats()['subscribers'] < args.subscribers:
+        time.sleep(0.01)
+
+    health = 100000
+    start = time.perf_counter()
+    for _ in range(args.updates):
+        health -= 10
+        published_at[health] = time.perf_counter()
+        state['boss'] = (1, health, False)
+        stream.publish(1, health, False)
+        time.sleep(1.0 / args.rate)
+    time.sleep(0.5)  # Let the last update drain
+    elapsed = time.perf_counter() - start
+    done.set()
+    stream.publish(1, health - 1, False)  # Wake subscribers so they exit
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * (len(latencies) - 1)))] * 1000
+    delivered = sum(received)
+    print(f'{args.subscribers} subscribers, {args.updates} updates at {args.rate:.0f}/s')
+    print(f'frames delivered:  {delivered} ({delivered / elapsed:.0f}/s)')
+    print(f'coalesced away:    {1 - delivered / (args.subscribers * args.updates):.1%}')
+    print(f'delivery latency:  p50 {pct(50):.2f} ms  p95 {pct(95):.2f} ms  p99 {pct(99):.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark the procedural level generator: generations/s and memo hit ratio
+
+Usage: python bench/bench_level_generator.py [--words 200] [--repeat 4] [--workers 2]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server_scripts')))
+
+from level_generator import LevelGenerator, generate_level
+
+SCRIPTS = ('fight_1', 'fight_2', 'fight_3', 'fight_4')
+
+
+def random_words(count, seed=0):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+            for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--words', type=int, default=200, help='distinct unknown words')
+    parser.add_argument('--repeat', type=int, default=4, help='times each word is requested')
+    parser.add_argument('--workers', type=int, default=2, help='generator processes')
+    parser.add_argument('--threads', type=int, default=16, help='concurrent request threads')
+    args = parser.parse_args()
+
+    words = random_words(args.words)
+
+    # Determinism: the same word always gives the same level
+    assert generate_level(words[0], SCRIPTS) == generate_level(words[0], SCRIPTS)
+
+    start = time.perf_counter()
+    for word in words[:50]:
+        generate_level(word, SCRIPTS)
+    inline_rate = 50 / (time.perf_counter() - start)
+
+    generator = LevelGenerator(max_workers=args.workers)
+    requests = words * args.repeat
+    random.Random(1).shuffle(requests)
+    generator.get('warmup', SCRIPTS)  # Start the worker processes outside the timing
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(lambda w: generator.get(w, SCRIPTS), requests))
+    elapsed = time.perf_counter() - start
+    generator.shutdown()
+
+    stats = generator.stats()
+    print(f'inline generation:   {inline_rate:8.1f} levels/s (single thread)')
+    print(f'pooled generation:   {(stats["generated"] - 1) / elapsed:8.1f} levels/s ({args.workers} processes)')
+    print(f'requests served:     {len(requests) / elapsed:8.1f} req/s ({len(requests)} requests)')
+    print(f'memo hit ratio:      {stats["hit_ratio"]:8.2%} ({stats["hits"]} hits, {stats["misses"]} misses)')
+
+
+if __name__ == '__main__':
+    main()
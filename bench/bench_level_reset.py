@@ -0,0 +1,101 @@
+"""Combat write latency while the levels table is reset
+
+Fills a throwaway database with generated levels and players parked on
+some of them, then resets the table twice: once with a single
+DELETE ... NOT IN statement, once with the batched LevelReset job.
+Meanwhile a thread plays the combat endpoints' part, a short write
+transaction every few milliseconds, and records how long each one took.
+
+Usage: python bench/bench_level_reset.py [--levels 200000] [--players 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server_scripts')))
+
+from database import create_tables
+from db_pool import get_pool
+from level_reset import LevelReset
+
+
+def populate(path, levels, players):
+    with get_pool(path).connection() as conn:
+        create_tables(conn)
+        conn.executemany('INSERT INTO levels (name, fight_script, accepted_letters) VALUES (?, ?, ?)',
+                         ((f'gen{i}', f'fight_{i % 4 + 1}', 'abc') for i in range(levels)))
+        rng = random.Random(7)
+        conn.executemany('INSERT INTO users (username, email, password_hash, created_at) VALUES (?, ?, ?, ?)',
+                         ((f'p{i}', f'p{i}@x', '-', '') for i in range(players)))
+        conn.executemany('INSERT INTO profiles (user_id, name, current_level) VALUES (?, ?, ?)',
+                         ((i + 1, f'p{i}', rng.randrange(1, levels)) for i in range(players)))
+        conn.commit()
+
+
+def combat(path, stop, latencies, interval=0.005):
+    """Short write transactions, like a hit landing on the world boss"""
+    with get_pool(path).connection() as conn:
+        while not stop.is_set():
+            start = time.perf_counter()
+            conn.execute('UPDATE users SET world_boss_dmg = world_boss_dmg + 1 WHERE user_id = 1')
+            conn.commit()
+            latencies.append(time.perf_counter() - start)
+            time.sleep(interval)
+
+
+def measure(path, reset):
+    stop, latencies = threading.Event(), []
+    player = threading.Thread(target=combat, args=(path, stop, latencies))
+    player.start()
+    time.sleep(0.2)
+    start = time.perf_counter()
+    reset()
+    elapsed = time.perf_counter() - start
+    time.sleep(0.2)
+    stop.set()
+    player.join()
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    with get_pool(path).connection() as conn:
+        left = conn.execute('SELECT COUNT(*) FROM levels').fetchone()[0]
+    return elapsed, pick(0.5), pick(0.99), latencies[-1] * 1000, left
+
+
+def naive(path):
+    with get_pool(path).connection() as conn:
+        conn.execute('''
+            DELETE FROM levels WHERE level_id NOT IN
+            (SELECT current_level FROM profiles WHERE current_level IS NOT NULL)
+            AND level_id NOT IN (SELECT MIN(level_id) FROM levels GROUP BY fight_script)
+        ''')
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--levels', type=int, default=200000)
+    parser.add_argument('--players', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--pause', type=float, default=0.01)
+    args = parser.parse_args()
+
+    print(f"{'method':>10}{'seconds':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'levels left':>13}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in ('naive', 'batched'):
+            path = os.path.join(workdir, f'{name}.db')
+            populate(path, args.levels, args.players)
+            if name == 'naive':
+                reset = lambda: naive(path)
+            else:
+                job = LevelReset(lambda: get_pool(path).connection(), args.batch_size, args.pause)
+                reset = job.run
+            elapsed, p50, p99, worst, left = measure(path, reset)
+            print(f'{name:>10}{elapsed:>10.2f}{p50:>10.2f}{p99:>10.2f}{worst:>10.1f}{left:>13}')
+
+
+if __name__ == '__main__':
+    main()
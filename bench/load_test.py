@@ -0,0 +1,257 @@
+"""Concurrent load test for the game API
+
+Simulates players going register -> login -> /game -> polling /api/boss ->
+/api/boss/damage and /api/player/hp. By default the Flask app runs
+in-process against a throwaway database; --url drives a running
+run_server.py instead.
+
+Usage:
+    python bench/load_test.py --players 50 --rounds 20
+    python bench/load_test.py --processes 4 --players 20     # several workers
+    python bench/load_test.py --url http://127.0.0.1:5000 --players 20
+    python bench/load_test.py --save bench/baseline.json
+    python bench/load_test.py --compare bench/baseline.json
+    python bench/load_test.py --no-rate-limit                # measure the write path, not 429s
+"""
+import argparse
+import http.cookiejar
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+SERVER_SCRIPTS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server_scripts'))
+
+LOCKED = 'database is locked'
+
+
+class InProcessClient:
+    """Flask test client, one per simulated player"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None, json_body=None):
+        try:
+            resp = self.client.open(path, method=method, data=form, json=json_body)
+            return resp.status_code, resp.get_data(as_text=True)
+        except Exception as e:  # PROPAGATE_EXCEPTIONS surfaces SQLite errors here
+            return 500, str(e)
+
+
+class HttpClient:
+    """urllib client with its own cookie jar, for a server started separately"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, form=None, json_body=None):
+        headers = {}
+        data = None
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=30) as resp:
+                return resp.status, resp.read().decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', 'replace')
+        except OSError as e:
+            return 599, str(e)
+
+
+def play(client, args, samples):
+    """One simulated player; appends (route, seconds, status, locked) to samples"""
+    name = f'bench_{uuid.uuid4().hex[:12]}'
+
+    def call(route, method, path, **kwargs):
+        start = time.perf_counter()
+        status, body = client.request(method, path, **kwargs)
+        samples.append((route, time.perf_counter() - start, status, LOCKED in body))
+        return status, body
+
+    call('/register', 'POST', '/register', form={
+        'username': name, 'email': f'{name}@bench.local',
+        'password': 'bench', 'confirm_password': 'bench'})
+    call('/login', 'POST', '/login', form={'username': name, 'password': 'bench'})
+    call('/game', 'GET', f'/game?fight={args.fight}')
+    for _ in range(args.rounds):
+        call('/api/boss', 'GET', f'/api/boss?fight={args.fight}')
+        call('/api/boss/damage', 'POST', f'/api/boss/damage?fight={args.fight}', json_body={'damage': args.damage})
+        call('/api/player/hp', 'POST', '/api/player/hp', json_body={'damage': 1})
+
+
+def setup_app(workdir, rate_limit=True):
+    """Import the app against a fresh database in workdir"""
+    os.chdir(workdir)
+    sys.path.insert(0, SERVER_SCRIPTS)
+    import app as app_module
+    config = {key: os.path.join(workdir, key.lower())
+              for key in ('UPLOAD_FOLDER', 'PROFILE_FOLDER', 'PROFILE_PICTURES_FOLDER', 'MEDIA_FOLDER',
+                        'ASSETS_FOLDER')}
+    config['PROPAGATE_EXCEPTIONS'] = True
+    if not rate_limit:
+        config['RATE_LIMITS'] = {endpoint: {0: (1e9, 1e9)} for endpoint in app_module.app.config['RATE_LIMITS']}
+    return app_module.create_app(config)
+
+
+def run_players(args, app=None):
+    """Run args.players concurrent players in this process and return the samples"""
+    samples = []
+    threads = []
+    for _ in range(args.players):
+        client = HttpClient(args.url) if args.url else InProcessClient(app)
+        threads.append(threading.Thread(target=play, args=(client, args, samples)))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples
+
+
+def _worker(args, queue):
+    queue.put(run_players(args, None if args.url else sys.modules['app'].app))
+
+
+def world_boss_state():
+    """World boss rows and shared HP after the run, to check workers agreed"""
+    import sqlite3
+    app_module = sys.modules['app']
+    conn = sqlite3.connect(app_module.DATABASE)
+    live = conn.execute("SELECT COUNT(*) FROM world_boss WHERE status = 'active'").fetchone()[0]
+    archived = conn.execute('SELECT COUNT(*) FROM world_boss_archive').fetchone()[0]
+    conn.close()
+    boss_id, health, defeated = app_module.shared_world_boss.snapshot()
+    # Exactly one active row; two would mean a double spawn
+    return {'bosses': live + archived, 'live_rows': live, 'shared_boss_id': boss_id, 'shared_health': health}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed, args):
+    routes = {}
+    for route, seconds, status, locked in samples:
+        r = routes.setdefault(route, {'latencies': [], 'errors': 0, 'locked': 0, 'throttled': 0})
+        r['latencies'].append(seconds)
+        r['errors'] += status >= 500
+        r['throttled'] += status == 429
+        r['locked'] += locked
+    report = {
+        'config': {'players': args.players, 'processes': args.processes, 'rounds': args.rounds,
+                   'fight': args.fight, 'mode': 'http' if args.url else 'in-process'},
+        'requests': len(samples),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'locked': sum(r['locked'] for r in routes.values()),
+        'routes': {},
+    }
+    for route, r in sorted(routes.items()):
+        lat = sorted(r['latencies'])
+        report['routes'][route] = {
+            'count': len(lat),
+            'errors': r['errors'],
+            'locked': r['locked'],
+            'throttled': r['throttled'],
+            'p50_ms': round(percentile(lat, 50) * 1000, 3),
+            'p95_ms': round(percentile(lat, 95) * 1000, 3),
+            'p99_ms': round(percentile(lat, 99) * 1000, 3),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"{report['requests']} requests in {report['elapsed_s']}s "
+          f"= {report['throughput_rps']} req/s, {report['locked']} 'database is locked'")
+    if 'world_boss' in report:
+        wb = report['world_boss']
+        print(f"world boss: {wb['bosses']} spawned, {wb['live_rows']} live row(s), "
+              f"shared HP {wb['shared_health']} (boss {wb['shared_boss_id']})")
+    print(f"{'route':<20}{'count':>8}{'errors':>8}{'locked':>8}{'429':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, r in report['routes'].items():
+        print(f"{route:<20}{r['count']:>8}{r['errors']:>8}{r['locked']:>8}{r.get('throttled', 0):>8}"
+              f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+
+
+def print_comparison(report, baseline):
+    def delta(new, old):
+        return f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+
+    print(f"\nvs baseline: throughput {baseline['throughput_rps']} -> {report['throughput_rps']} req/s "
+          f"({delta(report['throughput_rps'], baseline['throughput_rps'])})")
+    for route, r in report['routes'].items():
+        old = baseline['routes'].get(route)
+        if old:
+            print(f"  {route:<20} p50 {delta(r['p50_ms'], old['p50_ms']):>8}  "
+                  f"p95 {delta(r['p95_ms'], old['p95_ms']):>8}  p99 {delta(r['p99_ms'], old['p99_ms']):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent load test for the game API')
+    parser.add_argument('--players', type=int, default=20, help='concurrent players per process')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes (in-process mode forks)')
+    parser.add_argument('--rounds', type=int, default=20, help='poll/damage/hp rounds per player')
+    parser.add_argument('--fight', default='world_boss')
+    parser.add_argument('--damage', type=int, default=5)
+    parser.add_argument('--url', help='drive a running server instead of the in-process app')
+    parser.add_argument('--save', help='write the JSON report to this path')
+    parser.add_argument('--compare', help='compare against a saved JSON report')
+    parser.add_argument('--no-rate-limit', action='store_true', help='lift the per-player budgets (in-process only)')
+    args = parser.parse_args()
+
+    # setup_app() changes directory, resolve report paths first
+    args.save = args.save and os.path.abspath(args.save)
+    args.compare = args.compare and os.path.abspath(args.compare)
+
+    app = None
+    if not args.url:
+        app = setup_app(tempfile.mkdtemp(prefix='bench_'), rate_limit=not args.no_rate_limit)
+
+    start = time.perf_counter()
+    if args.processes > 1:
+        ctx = multiprocessing.get_context('fork') if not args.url else multiprocessing.get_context()
+        queue = ctx.Queue()
+        procs = [ctx.Process(target=_worker, args=(args, queue)) for _ in range(args.processes)]
+        for p in procs:
+            p.start()
+        samples = []
+        for _ in procs:
+            samples.extend(queue.get())
+        for p in procs:
+            p.join()
+    else:
+        samples = run_players(args, app)
+    elapsed = time.perf_counter() - start
+
+    report = summarize(samples, elapsed, args)
+    if app is not None and args.fight == 'world_boss':
+        report['world_boss'] = world_boss_state()
+    print_report(report)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nReport written to {args.save}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,6 @@
 class Boss :
+    __slots__ = ('name', 'health', 'key_word', 'script', 'world_boss')
+
     def __init__(self):
         self.name = "Boss"
         self.health = 200
@@ -1,4 +1,6 @@
 class Player :
+    __slots__ = ('username', 'hp', 'difficulty')
+
     def __init__(self):
         self.username = None
         self.hp = 100
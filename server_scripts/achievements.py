@@ -0,0 +1,239 @@
+import threading
+import time
+from array import array
+from collections import namedtuple
+from datetime import datetime
+
+# A counter follows one event type: 'count' adds 1, 'sum' adds a field,
+# 'max' keeps the highest value of a field. where is ((field, value), ...)
+# and must all match for the event to count.
+Counter = namedtuple('Counter', 'name event op field where')
+# A badge is earned once its counter reaches threshold
+Rule = namedtuple('Rule', 'badge title counter threshold')
+
+COUNTERS = (
+    Counter('boss_damage', 'boss_damage', 'sum', 'damage', ()),
+    Counter('world_boss_damage', 'boss_damage', 'sum', 'damage', (('world_boss', True),)),
+    Counter('bosses_defeated', 'boss_defeated', 'count', None, (('world_boss', False),)),
+    Counter('world_boss_kills', 'boss_defeated', 'count', None, (('world_boss', True),)),
+    Counter('deaths', 'player_death', 'count', None, ()),
+    Counter('max_difficulty', 'difficulty_set', 'max', 'difficulty', ()),
+)
+
+RULES = (
+    Rule('first_blood', 'First hit on a boss', 'boss_damage', 1),
+    Rule('heavy_hitter', '10,000 damage dealt', 'boss_damage', 10000),
+    Rule('wrecking_ball', '100,000 damage dealt', 'boss_damage', 100000),
+    Rule('raider', '1,000 damage to the world boss', 'world_boss_damage', 1000),
+    Rule('raid_veteran', '25,000 damage to the world boss', 'world_boss_damage', 25000),
+    Rule('boss_slayer', 'First boss defeated', 'bosses_defeated', 1),
+    Rule('boss_hunter', '25 bosses defeated', 'bosses_defeated', 25),
+    Rule('boss_nemesis', '100 bosses defeated', 'bosses_defeated', 100),
+    Rule('overlord_bane', 'Killing blow on the world boss', 'world_boss_kills', 1),
+    Rule('fallen', 'First death', 'deaths', 1),
+    Rule('stubborn', '50 deaths', 'deaths', 50),
+    Rule('daredevil', 'Played on hard', 'max_difficulty', 5),
+    Rule('inferno', 'Played on inferno', 'max_difficulty', 10),
+)
+
+
+def create_achievement_tables(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS achievement_counters(
+        user_id INTEGER NOT NULL,
+        counter TEXT NOT NULL,
+        value INTEGER NOT NULL,
+        PRIMARY KEY (user_id, counter)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_badges(
+        user_id INTEGER NOT NULL,
+        badge TEXT NOT NULL,
+        awarded_at TEXT NOT NULL,
+        PRIMARY KEY (user_id, badge)
+    ) WITHOUT ROWID
+    ''')
+
+
+class _UserState:
+    __slots__ = ('values', 'next', 'badges', 'touched')
+
+    def __init__(self, n_counters):
+        self.values = array('q', bytes(8 * n_counters))  # One slot per counter
+        self.next = array('H', bytes(2 * n_counters))  # Next unreached threshold per counter
+        self.badges = 0  # Bit i set once badge i is awarded
+        self.touched = 0.0
+
+
+class AchievementEngine:
+    """Awards badges from the events the game already produces
+
+    Rules are compiled into a dispatch table per event type, and each
+    counter keeps its thresholds sorted. So an event only touches the
+    counters that follow its type and checks one threshold each, however
+    many rules exist. Per-user state is a pair of small arrays and a badge
+    bitmask, loaded on a user's first event. Counter deltas and new badges
+    are written in one batch every persist_interval seconds, after which
+    idle users are dropped so other workers' progress is picked up.
+    """
+
+    def __init__(self, counters=COUNTERS, rules=RULES, persist_interval=10.0):
+        self.persist_interval = persist_interval
+        self.lock = threading.Lock()
+        self.compile(counters, rules)
+        self.users = {}  # user_id -> _UserState
+        self.dirty = {}  # user_id -> {counter index: delta, or new max}
+        self.new_badges = []  # (user_id, badge index, awarded_at)
+        self.last_persist = time.monotonic()
+        self.events = 0
+        self.awarded = 0
+
+    def compile(self, counters, rules):
+        self.counters = list(counters)
+        index = {c.name: i for i, c in enumerate(self.counters)}
+        self.badges = [r.badge for r in rules]
+        self.titles = {r.badge: r.title for r in rules}
+        thresholds = [[] for _ in self.counters]
+        for i, rule in enumerate(rules):
+            thresholds[index[rule.counter]].append((rule.threshold, i))
+        self.thresholds = [sorted(t) for t in thresholds]
+        dispatch = {}
+        for i, c in enumerate(self.counters):
+            if self.thresholds[i]:  # A counter no rule reads is not worth keeping
+                dispatch.setdefault(c.event, []).append((i, c.op, c.field, c.where))
+        self.dispatch = dispatch
+        self.counter_index = index
+
+    def _load(self, get_db, user_id):
+        conn = get_db()
+        state = _UserState(len(self.counters))
+        for name, value in conn.execute(
+                'SELECT counter, value FROM achievement_counters WHERE user_id = ?', (user_id,)):
+            i = self.counter_index.get(name)
+            if i is not None:
+                state.values[i] = value
+        badge_index = {b: i for i, b in enumerate(self.badges)}
+        for (badge,) in conn.execute('SELECT badge FROM user_badges WHERE user_id = ?', (user_id,)):
+            if badge in badge_index:
+                state.badges |= 1 << badge_index[badge]
+        return state
+
+    def record(self, get_db, user_id, event, **fields):
+        """Apply one event; returns the badges it awarded (usually none)"""
+        entries = self.dispatch.get(event)
+        if not entries or user_id is None:
+            return []
+        with self.lock:
+            self.events += 1
+            state = self.users.get(user_id)
+        if state is None:
+            state = self._load(get_db, user_id)  # Outside the lock: it's a query
+            with self.lock:
+                pending = self.dirty.get(user_id, {})
+                if user_id in self.users:
+                    state = self.users[user_id]  # Another thread loaded it first
+                else:
+                    for i, delta in pending.items():
+                        if self.counters[i].op == 'max':
+                            state.values[i] = max(state.values[i], delta)
+                        else:
+                            state.values[i] += delta
+                    self.users[user_id] = state
+        awarded = []
+        with self.lock:
+            state.touched = time.monotonic()
+            dirty = self.dirty.setdefault(user_id, {})
+            for i, op, field, where in entries:
+                if where and any(fields.get(k) != v for k, v in where):
+                    continue
+                if op == 'count':
+                    state.values[i] += 1
+                    dirty[i] = dirty.get(i, 0) + 1
+                elif op == 'sum':
+                    amount = int(fields.get(field) or 0)
+                    if amount <= 0:
+                        continue
+                    state.values[i] += amount
+                    dirty[i] = dirty.get(i, 0) + amount
+                else:
+                    value = int(fields.get(field) or 0)
+                    if value <= state.values[i]:
+                        continue
+                    state.values[i] = value
+                    dirty[i] = value
+                thresholds = self.thresholds[i]
+                n = state.next[i]
+                while n < len(thresholds) and state.values[i] >= thresholds[n][0]:
+                    badge = thresholds[n][1]
+                    if not state.badges >> badge & 1:
+                        state.badges |= 1 << badge
+                        self.new_badges.append((user_id, badge, datetime.now().isoformat()))
+                        awarded.append(self.badges[badge])
+                    n += 1
+                state.next[i] = n
+            self.awarded += len(awarded)
+        return awarded
+
+    def badges_of(self, get_db, user_id):
+        """Badges a user holds, including ones not yet written"""
+        with self.lock:
+            state = self.users.get(user_id)
+            mask = state.badges if state else None
+        if mask is None:
+            mask = self._load(get_db, user_id).badges
+        return [b for i, b in enumerate(self.badges) if mask >> i & 1]
+
+    def due(self):
+        return time.monotonic() - self.last_persist >= self.persist_interval
+
+    def persist(self, conn):
+        """Write counter deltas and new badges in one transaction"""
+        with self.lock:
+            dirty, self.dirty = self.dirty, {}
+            new_badges, self.new_badges = self.new_badges, []
+            self.last_persist = time.monotonic()
+        sums, maxes = [], []
+        for user_id, changes in dirty.items():
+            for i, value in changes.items():
+                row = (user_id, self.counters[i].name, value)
+                (maxes if self.counters[i].op == 'max' else sums).append(row)
+        try:
+            if sums:
+                conn.executemany('''
+                    INSERT INTO achievement_counters (user_id, counter, value) VALUES (?, ?, ?)
+                    ON CONFLICT (user_id, counter) DO UPDATE SET value = value + excluded.value
+                ''', sums)
+            if maxes:
+                conn.executemany('''
+                    INSERT INTO achievement_counters (user_id, counter, value) VALUES (?, ?, ?)
+                    ON CONFLICT (user_id, counter) DO UPDATE SET value = MAX(value, excluded.value)
+                ''', maxes)
+            if new_badges:
+                conn.executemany('INSERT OR IGNORE INTO user_badges (user_id, badge, awarded_at) VALUES (?, ?, ?)',
+                                 [(user_id, self.badges[b], at) for user_id, b, at in new_badges])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            with self.lock:
+                for user_id, changes in dirty.items():
+                    current = self.dirty.setdefault(user_id, {})
+                    for i, value in changes.items():
+                        if self.counters[i].op == 'max':
+                            current[i] = max(current.get(i, 0), value)
+                        else:
+                            current[i] = current.get(i, 0) + value
+                self.new_badges[:0] = new_badges
+            raise
+        # Users idle since the last round are reloaded on their next event,
+        # which merges what other workers wrote meanwhile
+        cutoff = time.monotonic() - self.persist_interval
+        with self.lock:
+            for user_id in [u for u, s in self.users.items() if s.touched < cutoff and u not in self.dirty]:
+                del self.users[user_id]
+        return len(sums) + len(maxes), len(new_badges)
+
+    def stats(self):
+        with self.lock:
+            return {'rules': len(self.badges), 'events': self.events, 'awarded': self.awarded,
+                    'users': len(self.users), 'pending_badges': len(self.new_badges)}
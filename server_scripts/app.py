@@ -1,83 +1,163 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, g, send_from_directory, make_response
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, g, send_from_directory, send_file, make_response, Response, Request
 import os
 from datetime import datetime
 import sqlite3
 from functools import wraps
 import hashlib
-from werkzeug.utils import secure_filename
 import random
-
+import glob
+import atexit
+import mimetypes
+import zlib
+import time
+import math
+import logging
+import json
 import sys
+
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from game_logic.player import Player
-import requests
-
-import json
-
-players = {}
-
+from session_store import SessionStore
 from game_logic.boss import Boss
+from damage_accumulator import DamageAccumulator
+from level_registry import LevelRegistry, Level
+from lexicon import get_lexicon, normalize
+from level_generator import LevelGenerator
+from metrics import Metrics, SampledLogger, TimedConnection
+from boss_stream import BossStream
+from world_boss_state import SharedWorldBoss
+from db_pool import get_pool
+from ttl_cache import TTLCache
+from leaderboard import Leaderboard
+from game_stats import GameStats
+from world_boss_scheduler import WorldBossScheduler, world_boss_health
+from rate_limiter import RateLimiter
+from achievements import AchievementEngine
+from image_pipeline import ImageUpload, ImagePipeline, InvalidImage
+from media_store import MediaStore
+from profile_versions import ProfileVersions
+from static_assets import AssetManifest, build as build_assets
 
-levels = ['fight_1', 'fight_2', 'fight_3', 'fight_4']
-words = ['conquest', 'despair', 'hunt', 'blood']
+# Request/SQL metrics and a sampled event log for the hot paths
+metrics = Metrics()
+game_log = SampledLogger('worldenderword', sample_rate=0.01)
 
+# Levels indexed by fight script, reloaded when the levels table changes
+level_registry = LevelRegistry()
+# Procedural levels for words that match no level
+level_generator = LevelGenerator()
+
+# Per-player fight state; abandoned fights expire after 30 idle minutes
+players = SessionStore(max_size=10000, idle_ttl=1800)
 # Shared world boss
 world_boss = Boss()
+# Write-behind buffer for world boss hits
+damage_accumulator = DamageAccumulator()
+# World boss damage ranking
+leaderboard = Leaderboard()
+# Player count and average difficulty without scanning users/profiles
+game_stats = GameStats()
+# Badges earned from combat and settings events
+achievements = AchievementEngine()
 
 def check_world_boss():
     """Check if the world boss exists, if not create it"""
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM world_boss',)
+    cursor.execute("SELECT 1 FROM world_boss WHERE status = 'active'")
     boss = cursor.fetchone()
     
     if not boss:
-        create_world_boss()  # Create world boss if it doesn't exist
-    else:
-        set_world_boss()  # Ensure world boss is set correctly
+        world_boss_scheduler.swap(conn, None, 'created')  # Activate the prepared successor
+    world_boss_scheduler.start()
+    set_world_boss()  # Ensure world boss is set correctly
         
 def set_world_boss():
     """Set the world boss with a default name and key word"""
     conn = get_db()
+    damage_accumulator.flush(conn)  # Don't lose buffered hits when reloading
     cursor = conn.cursor()
-    cursor.execute('SELECT name, health, level_model, key_word FROM world_boss ORDER BY boss_id DESC LIMIT 1',)
-    wb_name, wb_health, wb_script, wb_key_word = cursor.fetchone() # Get the last row (world boss)
-    print(f"World boss fetched: {wb_name} with health {wb_health} and key word '{wb_key_word}'")
-    # if wb_health == 0:
-    #     print("World boss health is 0, creating a new one.")
-    #     create_world_boss()
+    cursor.execute("SELECT boss_id, name, health, level_model, key_word FROM world_boss WHERE status = 'active' ORDER BY boss_id DESC LIMIT 1")
+    wb_id, wb_name, wb_health, wb_script, wb_key_word = cursor.fetchone() # Get the last row (world boss)
+    if not shared_world_boss.publish(wb_id, wb_health):
+        # The shared segment holds a newer boss: either another worker just
+        # created it, or it is left over from a database that was reset
+        shm_id = shared_world_boss.snapshot()[0]
+        if query_db("SELECT 1 FROM world_boss WHERE boss_id = ? AND status = 'active'", [shm_id], one=True):
+            return set_world_boss()
+        shared_world_boss.publish(wb_id, wb_health, force=True)
+    wb_health = shared_world_boss.snapshot()[1]  # Other workers may be ahead of the row
     world_boss.set_attributes(wb_name, wb_key_word, wb_script, wb_health, True)  # Set world boss attributes
-    print(f"World boss set: {world_boss.name} with health {world_boss.health} and key word '{world_boss.key_word}'")
+    damage_accumulator.track(wb_id)
+    game_log.event('world_boss_set', boss_id=wb_id, name=wb_name, health=wb_health, key_word=wb_key_word)
 
-def create_world_boss():
-    conn = get_db()
-    cursor = conn.cursor()
-    result = cursor.execute('SELECT user_id FROM users').fetchall()
-    num_players = len(result) if result else 1
-    base = 200 * num_players
-    scaling = base * ((num_players + 100) / 100)
-    raw_hp = base + scaling
-    raw_hp *= (1 + (num_players/100.0))  # Scale by number of players
-    # Round to nearest multiple of 50
-    print (f"Raw HP before rounding: {raw_hp}")
-    rounded_hp = int(round(raw_hp / 50.0) * 50)
-    cursor.execute('''
-        INSERT INTO world_boss (name, health, level_model, key_word, created_at)
-        VALUES (?, ?, ?, ?, ?)
-    ''', ('The Overlord',rounded_hp, random.choice(levels), random.choice(words), datetime.now().isoformat()))
-    conn.commit()
-    print("World boss created.")
-    set_world_boss()  # Ensure world boss is set correctly
+def spawn_world_boss(conn):
+    """Name, HP, fight script and keyword for the next world boss"""
+    level_registry.refresh(lambda: conn)
+    health = world_boss_health(game_stats.player_count(lambda: conn))
+    return 'The Overlord', health, random.choice(level_registry.scripts), random.choice(level_registry.words)
+
+def world_boss_swapped(old_id, new_id, health, outcome):
+    """Show a newly activated world boss to every worker and stream"""
+    shared_world_boss.publish(new_id, health)
+    boss_stream.publish(new_id, health, False)
+    game_log.event('world_boss_swapped', sample_rate=1.0, level=logging.INFO,
+                   old_boss_id=old_id, boss_id=new_id, health=health, outcome=outcome)
+
+# Retires a boss after this long even if nobody kills it
+WORLD_BOSS_LIFETIME = 24 * 3600
+
+# Pre-generates the next world boss and swaps it in on death or timeout
+world_boss_scheduler = WorldBossScheduler(lambda: get_pool(DATABASE).connection(), spawn_world_boss,
+                                          world_boss_swapped, snapshot=lambda: shared_world_boss.snapshot(),
+                                          lifetime=WORLD_BOSS_LIFETIME)
+
+def sync_world_boss():
+    """Bring the local world boss in line with the state shared by all workers"""
+    boss_id, health, defeated = shared_world_boss.snapshot()
+    if boss_id != damage_accumulator.boss_id:
+        check_world_boss()  # Another worker swapped in a new boss, reload it
+    else:
+        world_boss.health = health
 
 # Per-player bosses
-player_bosses = {}
+player_bosses = SessionStore(max_size=10000, idle_ttl=1800)
+
+def new_player_boss(username, fight):
+    """Create the personal boss for a fight script"""
+    level_registry.refresh(get_db)
+    boss = Boss()
+    boss.set_attributes("Mini Boss", level_registry.key_word(fight), fight, 200, False)
+    player_bosses[username] = boss
+    return boss
 
 
 template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'templates'))
 static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static'))
 app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
 DATABASE = 'app.db'
+# World boss HP shared by all worker processes on this machine
+shared_world_boss = SharedWorldBoss(DATABASE + '-boss.shm')
+# Profile version per user, shared by all workers; rendered pages are keyed on it
+profile_versions = ProfileVersions(DATABASE + '-profiles.shm')
+# Part of every page validator, so deploying new templates invalidates them
+TEMPLATES_MODIFIED = int(max((os.path.getmtime(p) for p in glob.glob(os.path.join(template_dir, '*.html'))), default=0))
+# Pushes world boss HP, defeat and respawn to /api/boss/stream clients
+boss_stream = BossStream(shared_world_boss.snapshot)
+# Resizes uploads off the request thread
+image_pipeline = ImagePipeline()
+
+# Media names never change meaning, cache them for a year
+MEDIA_MAX_AGE = 365 * 24 * 3600
+# Same for fingerprinted static files: a new build means new names
+ASSET_MAX_AGE = 365 * 24 * 3600
+# Static files the fight scripts load themselves, handed to them by URL
+GAME_ASSETS = ('words.json', 'sprites/knife.png', 'sprites/red_knife.png', 'sprites/shuriken.png')
+
+# Variant name -> ((width, height), crop), stored in profiles.<prefix>_<variant>
+PICTURE_VARIANTS = {'avatar': ((256, 256), True), 'thumb': ((64, 64), True)}
+BACKGROUND_VARIANTS = {'display': ((1920, 1080), False), 'thumb': ((320, 180), True)}
 
 # Allowed file extensions for uploads
 
@@ -85,20 +165,124 @@ app.config['UPLOAD_FOLDER'] = template_dir = os.path.abspath(os.path.join(os.pat
 app.config['PROFILE_FOLDER'] = template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static/profiles'))
 app.config['PROFILE_PICTURES_FOLDER'] = template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static/profile_pictures'))
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg'}
-# Increase max file size to 500MB
-app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
-app.secret_key = 'your-secret-key-here'  # Change this to a secure secret key
+# Hard cap on the whole request; images are checked more tightly while streaming
+app.config['MAX_CONTENT_LENGTH'] = 20 * 1024 * 1024
+app.config['MAX_IMAGE_BYTES'] = 16 * 1024 * 1024
+app.config['MAX_IMAGE_PIXELS'] = 40 * 1000 * 1000
+# Combat budgets per player: endpoint -> {min difficulty: (requests per second, burst)}
+app.config['RATE_LIMITS'] = {
+    'boss_damage': {1: (4, 8), 2: (5, 10), 5: (6, 12), 10: (8, 16)},
+    'player_hp': {1: (10, 20), 2: (12, 24), 5: (15, 30), 10: (20, 40)},
+    'combat_events': {1: (15, 30), 2: (15, 30), 5: (20, 40), 10: (25, 50)},
+}
+# Clients send 50 per hit; anything above this is clamped
+app.config['MAX_HIT_DAMAGE'] = 100
+# Uploaded images, stored by content hash and served from /media/<name>
+app.config['MEDIA_FOLDER'] = os.path.join(static_dir, 'media')
+# Set when a front-end server (nginx, Apache) should send media files itself
+app.config['USE_X_SENDFILE'] = False
+# Fingerprinted, precompressed copies of the static files, served from /assets/<name>
+app.config['ASSETS_FOLDER'] = os.path.join(static_dir, 'dist')
+# Word lists compiled into the synonym index: words.json plus any extra dictionaries
+app.config['LEXICON_SOURCES'] = [os.path.join(static_dir, 'words.json')] + sorted(glob.glob(os.path.join(static_dir, 'lexicons', '*.json')))
+app.config['LEXICON_SNAPSHOT'] = 'lexicon.snapshot'
+app.config['GENERATED_LEVELS_FOLDER'] = os.path.join(static_dir, 'generated_levels')
+# Every worker must sign sessions with the same key; set SECRET_KEY in production
+app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here')
+
+# Token buckets for the combat endpoints, in memory, no DB access
+rate_limiter = RateLimiter(app.config['RATE_LIMITS'])
+
+_media_store = None
+
+def media_store():
+    global _media_store
+    if _media_store is None or _media_store.root != app.config['MEDIA_FOLDER']:
+        _media_store = MediaStore(app.config['MEDIA_FOLDER'])
+    return _media_store
+
+# Endpoints whose file fields are images, checked while the body is still arriving
+IMAGE_UPLOAD_ENDPOINTS = {'update_profile_picture', 'update_background_image'}
+
+class UploadRequest(Request):
+    """Parses image uploads straight into checked temp files in the media store
+
+    A bad image stops the parse on the chunk that shows it, without reading
+    the rest of the body; accessing request.form or request.files then
+    raises InvalidImage.
+    """
 
-# Ensure required folders exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['PROFILE_PICTURES_FOLDER'], exist_ok=True)
-os.makedirs(app.config['PROFILE_FOLDER'], exist_ok=True)
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint not in IMAGE_UPLOAD_ENDPOINTS:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        upload = ImageUpload(media_store().root, app.config['MAX_IMAGE_BYTES'], app.config['MAX_IMAGE_PIXELS'])
+        self.image_uploads.append(upload)
+        return upload
 
-def get_user_pictures_folder(username):
-    """Create and return the path to the user's profile pictures folder"""
-    user_folder = os.path.join(app.config['PROFILE_PICTURES_FOLDER'], username)
-    os.makedirs(user_folder, exist_ok=True)
-    return user_folder
+    def _load_form_data(self):
+        self.image_uploads = []
+        super()._load_form_data()
+        for upload in self.image_uploads:
+            if upload.error is not None:
+                raise upload.error
+
+app.request_class = UploadRequest
+
+_static_assets = None
+
+def static_assets():
+    global _static_assets
+    if _static_assets is None or _static_assets.out_dir != app.config['ASSETS_FOLDER']:
+        _static_assets = AssetManifest(app.config['ASSETS_FOLDER'])
+    return _static_assets
+
+def static_url(filename):
+    """URL of a static file: its fingerprinted copy when the asset build has one"""
+    hashed = None if app.debug else static_assets().hashed_name(filename)
+    if hashed:
+        return url_for('get_asset', name=hashed)
+    return url_for('static', filename=filename)
+
+def asset_url_for(endpoint, **values):
+    """url_for for templates, sending static files to their fingerprinted copies"""
+    if endpoint == 'static' and list(values) == ['filename']:
+        return static_url(values['filename'])
+    return url_for(endpoint, **values)
+
+app.jinja_env.globals['url_for'] = asset_url_for
+
+def lexicon():
+    return get_lexicon(app.config['LEXICON_SOURCES'], app.config['LEXICON_SNAPSHOT'])
+
+def get_or_generate_level(word):
+    """Return the level for an unknown word, generating and storing it once"""
+    name = normalize(word)
+    if not name.isalpha() or len(name) > 32:
+        return None
+    level = level_registry.get_by_name(name)
+    if level:
+        return level
+    generated = level_generator.get(name, level_registry.scripts)
+    os.makedirs(app.config['GENERATED_LEVELS_FOLDER'], exist_ok=True)
+    background_path = os.path.join(app.config['GENERATED_LEVELS_FOLDER'], f'{name}.svg')
+    if not os.path.exists(background_path):
+        with open(background_path, 'w') as f:
+            f.write(generated['background_svg'])
+    background_url = f'/static/generated_levels/{name}.svg'
+    db = get_db()
+    db.execute('''
+        INSERT OR IGNORE INTO levels (name, fight_script, accepted_letters, timer, difficulty, background)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (name, generated['fight_script'], generated['accepted_letters'],
+          generated['timer'], generated['difficulty'], background_url))
+    db.commit()
+    row = query_db('''
+        SELECT level_id, name, fight_script, accepted_letters, timer, difficulty, background
+        FROM levels WHERE name = ?
+    ''', [name], one=True)
+    level = Level(*row)
+    level_registry.add(level)
+    return level
 
 def allowed_file(filename):
     """Check if filename has an allowed extension"""
@@ -110,15 +294,51 @@ def allowed_file(filename):
 def get_db():
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE, timeout=10)
-        db.row_factory = sqlite3.Row
+        # Counts and times every statement run through this request's connection
+        db = g._database = TimedConnection(get_pool(DATABASE).acquire(), metrics)
     return db
 
 @app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, '_database', None)
+    db = g.pop('_database', None)
     if db is not None:
-        db.close()
+        get_pool(DATABASE).release(db.raw)
+
+# Request timing
+@app.before_request
+def start_timer():
+    g._request_start = time.perf_counter()
+
+def record_request(status):
+    start = g.pop('_request_start', None)
+    if start is None:
+        return
+    db = getattr(g, '_database', None)
+    metrics.observe_request(request.endpoint, request.method, status,
+                            time.perf_counter() - start,
+                            db.count if db else 0, db.seconds if db else 0.0)
+
+@app.after_request
+def stop_timer(response):
+    record_request(response.status_code)
+    return response
+
+@app.teardown_request
+def stop_timer_on_error(exception):
+    record_request(500)  # Only still pending if no response was produced
+
+@atexit.register
+def flush_buffers():
+    """Write buffered world boss damage, leaderboard credits and badges before the process exits"""
+    badges_pending = achievements.dirty or achievements.new_badges
+    if not (damage_accumulator.pending or leaderboard.pending or badges_pending):
+        return
+    with get_pool(DATABASE).connection() as conn:
+        damage_accumulator.flush(conn)
+        if leaderboard.pending:
+            leaderboard.persist(conn)
+        if badges_pending:
+            achievements.persist(conn)
 
 def query_db(query, args=(), one=False):
     cur = get_db().execute(query, args)
@@ -130,14 +350,186 @@ def init_db():
     with app.app_context():
         # Import and run the database initialization from database.py
         from database import init_db as db_init
-        db_init()
-app.secret_key = 'your-secret-key-here'  # Change this to a secure secret key
+        db_init(DATABASE)
+
+def create_app(config=None):
+    """Apply config overrides, create the upload folders and the schema
+
+    Importing this module only builds the app object; anything that touches
+    the disk or the database happens here, once, in the process that will
+    serve (or fork the workers).
+    """
+    if config:
+        app.config.update(config)
+    rate_limiter.configure(app.config['RATE_LIMITS'])
+    for key in ('UPLOAD_FOLDER', 'PROFILE_PICTURES_FOLDER', 'PROFILE_FOLDER'):
+        os.makedirs(app.config[key], exist_ok=True)
+    init_db()
+    global _static_assets
+    build_assets(app.static_folder, app.config['ASSETS_FOLDER'])
+    _static_assets = None  # Pick up the new manifest
+    return app
+
+# Seconds spent on each startup step of this worker, exported on /metrics
+startup_timings = {}
+
+def warm_up(profiles=100):
+    """Load what the first requests would otherwise pay for
+
+    Activates the world boss, loads the level registry, the lexicon and
+    the leaderboard, and caches the users/profiles of the top players.
+    Returns the seconds spent per step.
+    """
+    def prime_profiles():
+        names = [row['username'] for row in leaderboard.top(profiles)]
+        if len(names) < profiles:
+            names += [row['username'] for row in query_db(
+                'SELECT username FROM users ORDER BY user_id DESC LIMIT ?', [profiles - len(names)])]
+        for username in names:
+            get_profile_row(username)
+
+    steps = (
+        ('world_boss', check_world_boss),
+        ('levels', lambda: level_registry.refresh(get_db)),
+        ('lexicon', lexicon),
+        ('leaderboard', ensure_leaderboard),
+        ('stats', lambda: game_stats.player_count(get_db)),
+        ('profiles', prime_profiles),
+    )
+    with app.app_context():
+        for name, step in steps:
+            start = time.perf_counter()
+            step()
+            startup_timings[f'warm_up_{name}'] = time.perf_counter() - start
+    game_log.event('warm_up', sample_rate=1.0, level=logging.INFO,
+                   **{k: round(v * 1000, 1) for k, v in startup_timings.items()})
+    return dict(startup_timings)
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
+# Users and profiles are read several times per request but rarely written.
+# Lookups go through a per-request memo, then a shared LRU. Entries are keyed
+# on the user's shared profile version, so a write in any worker makes every
+# worker's copy unreachable at once.
+user_cache = TTLCache(max_size=2048, ttl=30)
+
+def _request_memo():
+    if '_user_memo' not in g:
+        g._user_memo = {}
+    return g._user_memo
+
+def _user_keys(username):
+    version = profile_versions.get(username)[0]
+    return ('user', username, version), ('profile', username, version)
+
 def get_user_by_username(username):
-    return query_db('SELECT * FROM users WHERE username = ?', [username], one=True)
+    return user_cache.get_or_load(
+        _user_keys(username)[0],
+        lambda: query_db('SELECT * FROM users WHERE username = ?', [username], one=True),
+        _request_memo())
+
+def get_profile_row(username):
+    """Return the raw profiles row for a user, or None"""
+    def load():
+        user = get_user_by_username(username)
+        if not user:
+            return None
+        return query_db('SELECT * FROM profiles WHERE user_id = ?', [user['user_id']], one=True)
+    return user_cache.get_or_load(_user_keys(username)[1], load, _request_memo())
+
+def forget_user(username):
+    """Drop this worker's cached user/profile rows"""
+    keys = _user_keys(username)
+    user_cache.delete(*keys)
+    memo = _request_memo()
+    for key in keys:
+        memo.pop(key, None)
+
+def invalidate_user(username):
+    """Forget cached user/profile rows and rendered pages after a write"""
+    forget_user(username)
+    profile_versions.bump(username)
+
+# Rendered pages and JSON per (page, user), valid while the profile version is unchanged
+page_cache = TTLCache(max_size=4096, ttl=3600)
+
+def cached_page(kind, username, render, mimetype='text/html'):
+    """Serve a per-user page from the render cache, or 304 if the client has it
+
+    The validators come from the shared profile version, the templates and
+    the asset build the page links to, so revalidating an unchanged page
+    costs a memory read: no SQLite and no template.
+    """
+    version, modified = profile_versions.get(username) if username else (0, 0)
+    assets = static_assets()
+    owner = f'{zlib.crc32(username.encode()):x}' if username else 'anon'
+    etag = f'{kind}-{owner}-{version}-{TEMPLATES_MODIFIED}-{assets.digest}'
+    last_modified = max(modified, TEMPLATES_MODIFIED, assets.modified)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        since = request.if_modified_since
+        not_modified = since is not None and since.timestamp() >= last_modified
+    if not_modified:
+        resp = make_response('', 304)
+    else:
+        entry = page_cache.get((kind, username))
+        if entry is None or entry[0] != (version, assets.digest):
+            entry = ((version, assets.digest), render())
+            page_cache.set((kind, username), entry)
+        resp = make_response(entry[1])
+        resp.mimetype = mimetype
+    resp.set_etag(etag)
+    resp.last_modified = last_modified
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    resp.vary.add('Cookie')
+    return resp
+
+def save_image_upload(file):
+    """Move an uploaded image, already checked while parsing, into the media store
+
+    Returns (url, path). Raises InvalidImage if no dimensions were found.
+    """
+    store = media_store()
+    temp_path, fmt, width, height = file.stream.finish()
+    # The extension follows the content, not what the client called the file
+    name = store.put(temp_path, 'png' if fmt == 'png' else 'jpg')
+    path = store.path(name)
+    game_log.event('image_upload', sample_rate=1.0, level=logging.INFO,
+                   format=fmt, width=width, height=height, bytes=os.path.getsize(path))
+    return f'/media/{name}', path
+
+def build_image_variants(username, column, prefix, path, url, specs):
+    """Queue resized copies of an upload; their URLs land in <prefix>_<variant>
+
+    The UPDATE only applies while the profile still points at this upload,
+    so a slow job cannot overwrite a newer image.
+    """
+    url_folder = url.rsplit('/', 1)[0]
+
+    def on_done(variants):
+        assignments = ', '.join(f'{prefix}_{name} = ?' for name in variants)
+        values = [f'{url_folder}/{os.path.basename(p)}' for p in variants.values()]
+        with get_pool(DATABASE).connection() as conn:
+            conn.execute(f'''
+                UPDATE profiles SET {assignments}
+                WHERE user_id = (SELECT user_id FROM users WHERE username = ?) AND {column} = ?
+            ''', values + [username, url])
+            conn.commit()
+        # Runs outside any request, so there is no request memo to clear
+        user_cache.delete(*_user_keys(username))
+        profile_versions.bump(username)
+
+    image_pipeline.submit(path, specs, on_done)
+
+def image_variant_url(profile, column, prefix, size, default):
+    """URL of the requested variant, falling back to the original upload"""
+    if size != 'original':
+        variant = f'{prefix}_{size or default}'
+        if variant in profile.keys() and profile[variant]:
+            return profile[variant]
+    return profile[column]
 
 def create_user(username, email, password):
     db = get_db()
@@ -166,8 +558,10 @@ def create_user(username, email, password):
             (user_id, username, '#1f2937')
         )
         app.logger.debug(f"Profile created for user ID: {user_id} with name: {username}")
+        game_stats.player_added(db)
         
         db.commit()
+        game_stats.invalidate()
     except sqlite3.IntegrityError as e:
         db.rollback()
         raise Exception("Username or email already exists") from e
@@ -194,6 +588,7 @@ def update_user_profile(username, profile_data):
             user['user_id']
         ))
         db.commit()
+        invalidate_user(username)
 
 @app.route('/')
 def root():
@@ -207,14 +602,17 @@ def get_profile_picture(username):
     if not user:
         return '', 404
         
-    profile = query_db('SELECT picture FROM profiles WHERE user_id = ?', [user['user_id']], one=True)
+    profile = get_profile_row(username)
     if not profile or not profile['picture']:
         # Return default avatar if no profile picture exists
-        return redirect(url_for('static', filename='default-avatar.png'))
+        return redirect(static_url('default-avatar.png'))
         
     try:
         # Convert URL path to filesystem path
-        picture_url = profile['picture']
+        picture_url = image_variant_url(profile, 'picture', 'picture', request.args.get('size'), 'avatar')
+        if picture_url.startswith('/media/'):
+            # Immutable URL: the browser fetches it once and revalidates for free
+            return redirect(picture_url)
         if picture_url.startswith('/static/'):
             static_folder_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static'))
             file_path = os.path.join(static_folder_path, picture_url[len('/static/'):])
@@ -223,7 +621,7 @@ def get_profile_picture(username):
         
         # Check if file exists
         if not os.path.exists(file_path):
-            return redirect(url_for('static', filename='default-avatar.png'))
+            return redirect(static_url('default-avatar.png'))
             
         # Send file from filesystem
         return send_from_directory(
@@ -232,12 +630,79 @@ def get_profile_picture(username):
         )
     except Exception as e:
         app.logger.error(f"Error serving profile picture: {str(e)}")
-        return redirect(url_for('static', filename='default-avatar.png'))
+        return redirect(static_url('default-avatar.png'))
+
+@app.route('/media/<name>')
+def get_media(name):
+    """Serve an upload from the media store
+
+    Names are content hashes, so the name doubles as a strong ETag and
+    revalidation is answered without touching the database or the disk.
+    """
+    store = media_store()
+    path = store.path(name)
+    if path is None:
+        return '', 404
+    if request.if_none_match.contains(name):
+        resp = make_response('', 304)
+    else:
+        try:
+            # Handed to the server's wsgi.file_wrapper (sendfile) or X-Sendfile
+            resp = send_file(path, etag=False, conditional=False)
+        except FileNotFoundError:
+            return '', 404
+    resp.set_etag(name)
+    resp.headers['Cache-Control'] = f'public, max-age={MEDIA_MAX_AGE}, immutable'
+    return resp
+
+@app.route('/assets/<path:name>')
+def get_asset(name):
+    """Serve a fingerprinted static file, precompressed if the client accepts it
+
+    A name only ever refers to one content, so it is cached for a year and
+    revalidation is answered without touching the disk.
+    """
+    assets = static_assets()
+    if assets.path(name) is None:
+        return '', 404
+    encoding = assets.negotiate(name, request.accept_encodings)
+    etag = f'{name}.{encoding}' if encoding else name
+    if request.if_none_match.contains(etag):
+        resp = make_response('', 304)
+    else:
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        try:
+            resp = send_file(assets.path(name, encoding), mimetype=mimetype, etag=False, conditional=False)
+        except FileNotFoundError:
+            return '', 404
+        if encoding:
+            resp.headers['Content-Encoding'] = encoding
+    resp.set_etag(etag)
+    resp.vary.add('Accept-Encoding')
+    resp.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return resp
 
 def save_user_profile(username, profile_data):
     """Wrapper function that calls update_user_profile"""
     update_user_profile(username, profile_data)
 
+def throttle(endpoint, username, cost=1):
+    """None if the player is within their budget for endpoint, else a 429 response"""
+    player = players.get(username)
+    wait = rate_limiter.allow(endpoint, username, player.difficulty if player else None, cost)
+    if not wait:
+        return None
+    game_log.event('throttled', user=username, endpoint=endpoint, cost=cost)
+    wait = min(wait, 60.0)  # A batch larger than the burst can never pass
+    resp = jsonify({'error': 'Too many requests', 'retry_after': round(wait, 3)})
+    resp.status_code = 429
+    resp.headers['Retry-After'] = str(math.ceil(wait))
+    return resp
+
+def clamp_damage(value):
+    """Damage from a client as an int in [0, MAX_HIT_DAMAGE]"""
+    return max(0, min(int(value), app.config['MAX_HIT_DAMAGE']))
+
 # Login required decorator
 def login_required(f):
     @wraps(f)
@@ -253,7 +718,7 @@ def load_user_profile(username):
     if not user:
         return None
         
-    profile = query_db('SELECT * FROM profiles WHERE user_id = ?', [user['user_id']], one=True)
+    profile = get_profile_row(username)
     if profile:
         background_image_url = None
         if 'background_image' in profile.keys() and profile['background_image']:
@@ -336,18 +801,16 @@ def logout():
 @app.route('/home')
 @login_required
 def index():
-    if 'user' in session:
-        username = session['user']
-        profile_data = load_user_profile(username)
-        return render_template('index.html', profile=profile_data)
-    return render_template('index.html')
+    username = session['user']
+    return cached_page('home', username,
+                       lambda: render_template('index.html', profile=load_user_profile(username)))
 
 @app.route('/profile')
 @login_required
 def profile():
     username = session['user']
-    profile_data = load_user_profile(username)
-    return render_template('profile.html', profile=profile_data)
+    return cached_page('profile', username,
+                       lambda: render_template('profile.html', profile=load_user_profile(username)))
 
 @app.route('/upload_profile_picture', methods=['GET'])
 @login_required
@@ -357,8 +820,11 @@ def upload_profile_picture():
 @app.route('/update_profile_picture', methods=['POST'])
 @login_required
 def update_profile_picture():
-    if 'picture' not in request.files:
-        return jsonify({'success': False, 'error': 'No file uploaded'})
+    try:
+        if 'picture' not in request.files:
+            return jsonify({'success': False, 'error': 'No file uploaded'})
+    except InvalidImage as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     file = request.files['picture']
     if file.filename == '':
@@ -367,14 +833,10 @@ def update_profile_picture():
     if file and allowed_file(file.filename):
         try:
             username = session['user']
-            filename = secure_filename(file.filename)
-            user_pictures_folder = get_user_pictures_folder(username)
-            filepath = os.path.join(user_pictures_folder, filename)
-            file.save(filepath)
+            picture_url, filepath = save_image_upload(file)
             
             # Update profile data
             profile_data = load_user_profile(username)
-            picture_url = f'/static/profile_pictures/{username}/{filename}'
             profile_data['picture'] = picture_url
             save_user_profile(username, profile_data)
             # Update database with file path
@@ -384,15 +846,19 @@ def update_profile_picture():
                 return jsonify({'success': False, 'error': 'User not found'})
             app.logger.debug(f"Updating profile picture for user: {username}, file path: {filepath} picture_url: {picture_url}")
             db.execute(
-                'UPDATE profiles SET picture = ? WHERE user_id = ?',
+                'UPDATE profiles SET picture = ?, picture_avatar = NULL, picture_thumb = NULL WHERE user_id = ?',
                 (picture_url, user['user_id'])
             )
             db.commit()
+            invalidate_user(username)
+            build_image_variants(username, 'picture', 'picture', filepath, picture_url, PICTURE_VARIANTS)
             return jsonify({
                 'success': True,
                 'picture_url': picture_url
             })
             
+        except InvalidImage as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)})
     
@@ -416,26 +882,31 @@ def update_background_image():
             app.logger.debug(f"Updated background color: {profile['background_color']}")
         
         # Handle background image
+        uploaded = None
         if 'background_image' in request.files:
             file = request.files['background_image']
             if file and allowed_file(file.filename):
-                pictures_dir = os.path.join(app.config['UPLOAD_FOLDER'], username, 'pictures')
-                os.makedirs(pictures_dir, exist_ok=True)
-                
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(pictures_dir, filename)
-                file.save(file_path)
-                file_path = file_path.replace('\\', '/')
                 # Store URL path in profile for database update
-                profile['background_image'] = f'/static/uploads/{username}/pictures/{filename}'
+                profile['background_image'], uploaded = save_image_upload(file)
                 app.logger.debug(f"Updated background image path: {profile['background_image']}")
                 
         save_user_profile(username, profile)
+        if uploaded:
+            db = get_db()
+            db.execute('''
+                UPDATE profiles SET background_display = NULL, background_thumb = NULL
+                WHERE user_id = (SELECT user_id FROM users WHERE username = ?)
+            ''', (username,))
+            db.commit()
+            invalidate_user(username)
+            build_image_variants(username, 'background_image', 'background', uploaded, profile['background_image'], BACKGROUND_VARIANTS)
         return jsonify({
             'success': True,
             'background_color': profile['background_color'],
             'background_image': profile['background_image']
         })
+    except InvalidImage as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         app.logger.error(f"Error updating background: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -450,7 +921,7 @@ def get_background_image(username):
         app.logger.debug(f'User not found: {username}')
         return '', 404
         
-    profile = query_db('SELECT background_image FROM profiles WHERE user_id = ?', [user['user_id']], one=True)
+    profile = get_profile_row(username)
     if not profile:
         app.logger.debug('No profile found for user')
         return '', 404
@@ -461,7 +932,9 @@ def get_background_image(username):
         
     try:
         # Convert URL path to filesystem path
-        background_url = profile['background_image']
+        background_url = image_variant_url(profile, 'background_image', 'background', request.args.get('size'), 'display')
+        if background_url.startswith('/media/'):
+            return redirect(background_url)
         if background_url.startswith('/static/'):
             static_folder_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static'))
             file_path = os.path.join(static_folder_path, background_url[len('/static/'):])
@@ -494,23 +967,30 @@ def update_name():
                 (data['name'], user['user_id'])
             )
             db.commit()
+            invalidate_user(username)
             return jsonify({'success': True})
     return jsonify({'success': False, 'error': 'No name provided'}), 400
 
+def set_difficulty(username, difficulty):
+    """Store a player's difficulty and keep the difficulty totals in step"""
+    db = get_db()
+    user = get_user_by_username(username)
+    if not user:
+        return False
+    game_stats.difficulty_changed(db, user['user_id'], difficulty)
+    db.execute('UPDATE profiles SET difficulty = ? WHERE user_id = ?', (difficulty, user['user_id']))
+    db.commit()
+    game_stats.invalidate()
+    invalidate_user(username)
+    record_event(username, 'difficulty_set', difficulty=difficulty)
+    return True
+
 @app.route('/set_easy', methods=['POST'])
 @login_required
 def set_easy():
     data = request.get_json()
     if 'easy' in data:
-        username = session['user']
-        db = get_db()
-        user = get_user_by_username(username)
-        if user:
-            db.execute(
-                'UPDATE profiles SET difficulty = ? WHERE user_id = (SELECT user_id FROM users WHERE username = ?)',
-                (1, username)
-            )
-            db.commit()
+        if set_difficulty(session['user'], 1):
             return jsonify({'success': True})
         
 @app.route('/set_medium', methods=['POST'])
@@ -518,15 +998,7 @@ def set_easy():
 def set_medium():
     data = request.get_json()
     if 'medium' in data:
-        username = session['user']
-        db = get_db()
-        user = get_user_by_username(username)
-        if user:
-            db.execute(
-                'UPDATE profiles SET difficulty = ? WHERE user_id = (SELECT user_id FROM users WHERE username = ?)',
-                (2, username)
-            )
-            db.commit()
+        if set_difficulty(session['user'], 2):
             return jsonify({'success': True})
 
 @app.route('/set_hard', methods=['POST'])
@@ -534,15 +1006,7 @@ def set_medium():
 def set_hard():
     data = request.get_json()
     if 'hard' in data:
-        username = session['user']
-        db = get_db()
-        user = get_user_by_username(username)
-        if user:
-            db.execute(
-                'UPDATE profiles SET difficulty = ? WHERE user_id = (SELECT user_id FROM users WHERE username = ?)',
-                (5, username)
-            )
-            db.commit()
+        if set_difficulty(session['user'], 5):
             return jsonify({'success': True})
 
 @app.route('/set_inferno', methods=['POST'])
@@ -550,40 +1014,60 @@ def set_hard():
 def set_inferno():
     data = request.get_json()
     if 'inferno' in data:
-        username = session['user']
-        db = get_db()
-        user = get_user_by_username(username)
-        print (f"Setting inferno difficulty for user: {username}")
-        if user:
-            db.execute(
-                'UPDATE profiles SET difficulty = ? WHERE user_id = (SELECT user_id FROM users WHERE username = ?)',
-                (10, username)
-            )
-            db.commit()
+        if set_difficulty(session['user'], 10):
             return jsonify({'success': True})
 
 @app.route('/get_background')
 def get_background():
-    if 'user' in session:
-        username = session['user']
-        profile = load_user_profile(username)
+    username = session.get('user')
+
+    def render():
+        profile = load_user_profile(username) if username else None
         if profile:
-            return jsonify({
+            return json.dumps({
                 'background_color': profile.get('background_color', '#1f2937'),
                 'background_image': profile.get('background_image')
             })
-    # Default background if no user or profile
-    return jsonify({
-        'background_color': '#1f2937',
-        'background_image': None
-    })
+        # Default background if no user or profile
+        return json.dumps({
+            'background_color': '#1f2937',
+            'background_image': None
+        })
+    return cached_page('background', username, render, mimetype='application/json')
     
 
+def set_current_level(username, level_id):
+    """Remember the level a player is on, so level resets keep it"""
+    user = get_user_by_username(username)
+    if not user:
+        return
+    db = get_db()
+    db.execute('UPDATE profiles SET current_level = ? WHERE user_id = ? AND current_level IS NOT ?',
+               (level_id, user['user_id'], level_id))
+    db.commit()
+
 @app.route('/game')
 @login_required
 def game():
     username = session['user']
     fight_script_name = request.args.get('fight', 'fight_2')
+    entered_level = request.args.get('level')
+    level_background = None
+    if entered_level:
+        # Sub-level: a synonym plays the fight of the level it belongs to
+        level = level_registry.get_by_name(lexicon().resolve(entered_level))
+        if not level:
+            # Unknown word: play its procedurally generated level
+            level = get_or_generate_level(entered_level)
+        if level:
+            fight_script_name = level.fight_script
+            level_background = level.background
+            set_current_level(username, level.level_id)
+    else:
+        level_registry.refresh(get_db)
+        level = level_registry.by_script.get(fight_script_name)
+        if level:
+            set_current_level(username, level.level_id)
     rush = request.args.get('rush', 'false').lower() == 'true'
     fight_script = f'js/{fight_script_name}'
 
@@ -591,34 +1075,23 @@ def game():
     players[username] = Player()
 
     # Set difficulty
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT difficulty FROM profiles WHERE user_id = (SELECT user_id FROM users WHERE username = ?)', (username,))
-    difficulty = cursor.fetchone()
-    players[username].setDifficulty(difficulty[0] if difficulty else 2)
+    profile = get_profile_row(username)
+    players[username].setDifficulty(profile['difficulty'] if profile else 2)
 
     # Special handling
     if 'world_boss' in fight_script:
         check_world_boss()  # Ensure world boss exists
         global world_boss
         fight_script = f'js/{world_boss.script}'
-        cursor.execute('SELECT AVG(difficulty) FROM profiles')
-        difficulty = cursor.fetchone()[0]
-        players[username].setDifficulty(difficulty)
+        players[username].setDifficulty(game_stats.average_difficulty(get_db))
     else:
         # INDIVIDUAL BOSS
-        boss_word = "conquest"
-        for i in range(len(levels)):
-            if fight_script_name == levels[i]:
-                boss_word = words[i]
-                break
-        boss = Boss()
-        print(f"[DEBUG] Initializing player boss for {username} with word '{boss_word}'")
-        boss.set_attributes("Mini Boss", boss_word, fight_script_name, 200, False)
-        player_bosses[username] = boss
-        print(f"Player {username}'s boss initialized.")
-
-    return render_template('game.html', fight_script=fight_script, rush=rush)
+        boss = new_player_boss(username, fight_script_name)
+        game_log.event('player_boss_created', user=username, fight=fight_script_name, key_word=boss.key_word)
+
+    asset_urls = {name: static_url(name) for name in GAME_ASSETS}
+    return render_template('game.html', fight_script=fight_script, rush=rush, level_background=level_background,
+                           asset_urls=asset_urls)
 
 @app.route('/api/boss', methods=['GET'])
 @login_required
@@ -627,20 +1100,14 @@ def get_boss():
     fight = request.args.get('fight', 'fight_2')
 
     if fight == 'world_boss':
+        sync_world_boss()
         boss = world_boss
     else:
         boss = player_bosses.get(username)
         if not boss:
-            boss_word = "conquest"
-            for i in range(len(levels)):
-                if fight == levels[i]:
-                    boss_word = words[i]
-                    break
-            boss = Boss()
-            boss.set_attributes("Mini Boss", boss_word, fight, 200, False)
-            player_bosses[username] = boss
-
-    print(f"[DEBUG-GET] fight={fight}, boss.health={boss.health}, boss.name={boss.name}, boss.key_word={boss.key_word}")
+            boss = new_player_boss(username, fight)
+
+    game_log.event('boss_get', user=username, fight=fight, health=boss.health, key_word=boss.key_word)
     return jsonify({
         'name': boss.name,
         'health': boss.health,
@@ -652,48 +1119,107 @@ def get_boss():
 @login_required
 def get_difficulty():
     difficulty = players[session['user']].difficulty
-    print(difficulty)
     return jsonify({
         'difficulty': difficulty
     })
 
+def current_boss(username, fight):
+    """The boss a player is fighting: the world boss or their personal one"""
+    if fight == 'world_boss':
+        sync_world_boss()
+        return world_boss
+    boss = player_bosses.get(username)
+    if not boss:
+        boss = new_player_boss(username, fight)
+    return boss
+
+def hit_boss(username, boss, damage):
+    """Apply one hit and return (defeated, flush_due)
+
+    World boss damage is only buffered; callers flush it once they are
+    done with the request's hits.
+    """
+    if not boss.world_boss:
+        boss.take_dmg(damage)
+        record_event(username, 'boss_damage', damage=damage, world_boss=False)
+        if boss.health <= 0:
+            player_bosses.pop(username, None)  # Clean up if personal
+            record_event(username, 'boss_defeated', world_boss=False)
+            return True, False
+        return False, False
+    # Hits land in shared memory right away; the row is decremented in batches
+    boss_id = damage_accumulator.boss_id
+    boss.health, killed, dealt = shared_world_boss.hit(boss_id, damage)
+    boss_stream.publish(boss_id, boss.health, boss.health <= 0)
+    user = get_user_by_username(username)
+    user_id = user['user_id'] if user else None
+    flush_due = damage_accumulator.add(dealt, user_id)
+    if user:
+        leaderboard.credit(user_id, username, dealt)
+    record_event(username, 'boss_damage', damage=dealt, world_boss=True)
+    defeated = boss.health <= 0
+    if killed:
+        record_event(username, 'boss_defeated', world_boss=True)
+        # Only the killing blow, in whichever worker, swaps in the prepared successor
+        conn = get_db()
+        try:
+            damage_accumulator.flush(conn)
+            world_boss_scheduler.swap(conn, boss_id, 'defeated')
+        except sqlite3.Error as e:
+            # The scheduler sees the dead boss on its next tick and retries
+            game_log.event('world_boss_swap_failed', sample_rate=1.0, level=logging.WARNING,
+                           boss_id=boss_id, error=repr(e))
+            world_boss_scheduler.loop.wake()
+        sync_world_boss()
+    return defeated, flush_due
+
+def record_event(username, event, **fields):
+    """Feed a game event to the achievements engine, return any badges it earned"""
+    user = get_user_by_username(username)
+    if not user:
+        return []
+    awarded = achievements.record(get_db, user['user_id'], event, **fields)
+    if awarded:
+        game_log.event('badges_awarded', sample_rate=1.0, level=logging.INFO, user=username, badges=awarded)
+    if achievements.due():
+        achievements.persist(get_db())
+    return awarded
+
+def hit_player(username, damage):
+    """Apply damage to a player and return their HP"""
+    player = players.get(username)
+    if player is None:
+        player = players[username] = Player()
+    player.hp -= damage
+    if player.hp < 0:
+        player.hp = 0
+    # Delete player object if hp is 0 (player died)
+    if player.hp == 0:
+        players.pop(username, None)
+        record_event(username, 'player_death')
+    return player.hp
+
 @app.route('/api/boss/damage', methods=['POST'])
 @login_required
 def damage_boss():
     username = session['user']
+    throttled = throttle('boss_damage', username)
+    if throttled:
+        return throttled
     fight = request.args.get('fight', 'fight_2')
-    if fight == 'world_boss':
-        boss = world_boss
-    else:
-        boss = player_bosses.get(username)
-        if not boss:
-            boss_word = "conquest"
-            for i in range(len(levels)):
-                if fight == levels[i]:
-                    boss_word = words[i]
-                    break
-            boss = Boss()
-            boss.set_attributes("Mini Boss", boss_word, fight, 200, False)
-            player_bosses[username] = boss
-    print(f"[DEBUG-DMG] fight={fight}, boss.health={boss.health}")
-    data = request.get_json()
-    damage = data.get('damage', 0)
-    boss.take_dmg(damage)
-    defeated = False
+    data = request.get_json(silent=True) or {}
+    try:
+        damage = clamp_damage(data.get('damage', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'damage must be a number'}), 400
+    boss = current_boss(username, fight)
+    defeated, flush_due = hit_boss(username, boss, damage)
+    if flush_due:
+        damage_accumulator.flush(get_db())
     if boss.world_boss:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE world_boss SET health = ? WHERE boss_id = (SELECT boss_id FROM world_boss ORDER BY boss_id DESC LIMIT 1)', (boss.health,))
-        conn.commit()
-    if boss.health <= 0:
-        defeated = True
-        if fight != 'world_boss':
-            player_bosses.pop(username, None)  # Clean up if personal
-        else:
-            world_boss.health = 0
-            # Reset world boss for next fight
-            create_world_boss()
+        ensure_leaderboard()
 
+    game_log.event('boss_damage', user=username, fight=fight, damage=damage, health=boss.health, defeated=defeated)
     return jsonify({
         'health': boss.health,
         'defeated': defeated
@@ -712,17 +1238,246 @@ def player_hp():
         return jsonify({'hp': player.hp})
 
     if request.method == 'POST':
-        data = request.get_json()
-        damage = data.get('damage', 0)
-        player.hp -= damage
-        if player.hp < 0:
-            player.hp = 0
-        # Delete player object if hp is 0 (player died)
-        if player.hp == 0:
-            del players[username]
-        return jsonify({'hp': player.hp})
+        throttled = throttle('player_hp', username)
+        if throttled:
+            return throttled
+        data = request.get_json(silent=True) or {}
+        try:
+            damage = clamp_damage(data.get('damage', 0))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'damage must be a number'}), 400
+        return jsonify({'hp': hit_player(username, damage)})
+
+
+@app.route('/api/boss/stream', methods=['GET'])
+@login_required
+def world_boss_stream():
+    """Server-Sent Events: 'hp', 'defeated' and 'respawn' for the world boss"""
+    sync_world_boss()  # Make sure the shared segment holds a boss
+    resp = Response(boss_stream.subscribe(), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'  # Don't let a proxy buffer the stream
+    return resp
+
+
+MAX_COMBAT_EVENTS = 256
+
+@app.route('/api/combat/events', methods=['POST'])
+@login_required
+def combat_events():
+    """Apply a batch of timestamped hits in order and return both sides' HP
+
+    Body: {"events": [{"type": "player_damage" | "boss_damage", "damage": n, "t": ms}, ...]}
+    Replaces one /api/player/hp or /api/boss/damage call per collision.
+    """
+    username = session['user']
+    throttled = throttle('combat_events', username)
+    if throttled:
+        return throttled
+    fight = request.args.get('fight', 'fight_2')
+    data = request.get_json(silent=True) or {}
+    events = data.get('events')
+    if not isinstance(events, list) or len(events) > MAX_COMBAT_EVENTS:
+        return jsonify({'error': f'events must be a list of at most {MAX_COMBAT_EVENTS} items'}), 400
+    try:
+        events = sorted(
+            ((float(e.get('t', 0)), e['type'], int(e.get('damage', 0))) for e in events),
+            key=lambda e: e[0])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return jsonify({'error': 'malformed event'}), 400
+    # Hits on the boss share the /api/boss/damage budget
+    boss_hits = sum(1 for _, kind, _ in events if kind == 'boss_damage')
+    if boss_hits:
+        throttled = throttle('boss_damage', username, boss_hits)
+        if throttled:
+            return throttled
+
+    boss = None
+    hp = players[username].hp if username in players else Player().hp
+    defeated = False
+    flush_due = False
+    applied = 0
+    for _, kind, damage in events:
+        if damage < 0 or hp <= 0 or defeated:
+            continue  # Nothing happens after either side is down
+        damage = min(damage, app.config['MAX_HIT_DAMAGE'])
+        if kind == 'player_damage':
+            hp = hit_player(username, damage)
+        elif kind == 'boss_damage':
+            boss = boss or current_boss(username, fight)
+            defeated, due = hit_boss(username, boss, damage)
+            flush_due = flush_due or due
+        else:
+            continue
+        applied += 1
+    # One write-back for the whole batch
+    if flush_due:
+        damage_accumulator.flush(get_db())
+    if boss is not None and boss.world_boss:
+        ensure_leaderboard()
+    boss = boss or current_boss(username, fight)
+
+    game_log.event('combat_events', user=username, fight=fight, events=len(events), applied=applied, hp=hp, health=boss.health)
+    return jsonify({
+        'hp': hp,
+        'boss_health': boss.health,
+        'defeated': defeated,
+        'applied': applied
+    })
+
+
+def ensure_leaderboard():
+    """Load the ranking on first use; a background thread persists it after that"""
+    if not leaderboard.loaded:
+        leaderboard.persist(get_db())
+    leaderboard.start(lambda: get_pool(DATABASE).connection())
+
+@app.route('/api/boss/history', methods=['GET'])
+def world_boss_history():
+    """Recently ended world bosses with their top damage dealers"""
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    bosses = query_db('''
+        SELECT boss_id, name, max_health, key_word, created_at, ended_at, outcome
+        FROM world_boss_archive ORDER BY boss_id DESC LIMIT ?
+    ''', [limit])
+    top = {}
+    if bosses:
+        rows = query_db(f'''
+            SELECT boss_id, username, damage, hits FROM (
+                SELECT d.boss_id, u.username, d.damage, d.hits,
+                       ROW_NUMBER() OVER (PARTITION BY d.boss_id ORDER BY d.damage DESC) AS place
+                FROM world_boss_damage d JOIN users u ON u.user_id = d.user_id
+                WHERE d.boss_id IN ({','.join('?' * len(bosses))})
+            ) WHERE place <= 3 ORDER BY boss_id, place
+        ''', [b['boss_id'] for b in bosses])
+        for row in rows:
+            top.setdefault(row['boss_id'], []).append(
+                {'username': row['username'], 'damage': row['damage'], 'hits': row['hits']})
+    return jsonify([dict(b, top=top.get(b['boss_id'], [])) for b in bosses])
+
+@app.route('/api/achievements', methods=['GET'])
+@login_required
+def get_achievements():
+    """Badges the current player has earned"""
+    user = get_user_by_username(session['user'])
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    badges = achievements.badges_of(get_db, user['user_id'])
+    return jsonify({
+        'badges': [{'badge': b, 'title': achievements.titles[b]} for b in badges],
+        'available': len(achievements.badges)
+    })
+
+@app.route('/api/leaderboard', methods=['GET'])
+def get_leaderboard():
+    ensure_leaderboard()
+    top = max(1, min(request.args.get('top', 10, type=int), 100))
+    return jsonify({
+        'players': leaderboard.size(),
+        'top': leaderboard.top(top)
+    })
+
+@app.route('/api/leaderboard/me', methods=['GET'])
+@login_required
+def get_my_rank():
+    ensure_leaderboard()
+    username = session['user']
+    user = get_user_by_username(username)
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    rank, damage = leaderboard.rank_of(user['user_id'])
+    return jsonify({
+        'username': username,
+        'rank': rank,
+        'damage': damage,
+        'players': leaderboard.size()
+    })
+
+@app.route('/api/lexicon/resolve', methods=['GET'])
+@login_required
+def resolve_word():
+    """Resolve a (partially) typed word to its level, cheap enough per keystroke"""
+    word = request.args.get('word', '')
+    lex = lexicon()
+    level_name = lex.resolve(word)
+    level = level_registry.get_by_name(level_name)
+    return jsonify({
+        'word': word,
+        'normalized': normalize(word),
+        'level': level_name,
+        'fight_script': level.fight_script if level else None,
+        'completions': lex.complete(word) if word else []
+    })
+
+@app.route('/api/db/pool', methods=['GET'])
+def db_pool_stats():
+    """Connection pool size and wait times"""
+    return jsonify(get_pool(DATABASE).stats())
+
+@app.route('/api/levels/generator/stats', methods=['GET'])
+def level_generator_stats():
+    """Generated levels and memo hit ratio"""
+    return jsonify(level_generator.stats())
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for the user and profile cache"""
+    return jsonify(user_cache.stats())
+
+@app.route('/api/sessions/stats', methods=['GET'])
+def session_stats():
+    """Live game sessions and their estimated memory use"""
+    return jsonify({
+        'players': players.stats(),
+        'player_bosses': player_bosses.stats()
+    })
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition for this worker process"""
+    gauges = []
+    for key, value in get_pool(DATABASE).stats().items():
+        gauges.append((f'db_pool_{key}', 'SQLite connection pool', value, []))
+    for key in ('size', 'hits', 'misses', 'memo_hits', 'evictions', 'invalidations'):
+        gauges.append((f'user_cache_{key}', 'User/profile cache', user_cache.stats()[key], []))
+    for key in ('size', 'hits', 'misses', 'evictions'):
+        gauges.append((f'page_cache_{key}', 'Rendered page cache', page_cache.stats()[key], []))
+    for store_name, store in (('players', players), ('player_bosses', player_bosses)):
+        stats = store.stats()
+        for key in ('live', 'expired', 'evicted', 'memory_bytes'):
+            gauges.append((f'game_sessions_{key}', 'Per-player fight state', stats[key], [('store', store_name)]))
+    boss_id, health, defeated = shared_world_boss.snapshot()
+    gauges.append(('world_boss_health', 'Shared world boss HP', health, [('boss_id', boss_id)]))
+    gauges.append(('world_boss_pending_damage', 'Damage buffered in this worker', damage_accumulator.pending, []))
+    gauges.append(('boss_stream_subscribers', 'Open world boss streams', boss_stream.stats()['subscribers'], []))
+    gauges.append(('leaderboard_players', 'Players with world boss damage', leaderboard.size(), []))
+    gauges.append(('leaderboard_persist_errors', 'Failed leaderboard persists', leaderboard.loop.errors, []))
+    gauges.append(('registered_players', 'Registered players', game_stats.player_count(get_db), []))
+    badges = achievements.stats()
+    for key in ('events', 'awarded', 'users'):
+        gauges.append((f'achievements_{key}', 'Achievements engine', badges[key], []))
+    limits = rate_limiter.stats()
+    for endpoint, n in limits['throttled'].items():
+        gauges.append(('rate_limit_throttled', 'Requests rejected with 429', n, [('endpoint', endpoint)]))
+    for endpoint, n in limits['allowed'].items():
+        gauges.append(('rate_limit_allowed', 'Requests within budget', n, [('endpoint', endpoint)]))
+    gauges.append(('rate_limit_buckets', 'Token buckets held in memory', limits['buckets'], []))
+    scheduler = world_boss_scheduler.stats()
+    for outcome, n in scheduler['swaps'].items():
+        gauges.append(('world_boss_swaps', 'World bosses replaced by this worker', n, [('outcome', outcome)]))
+    gauges.append(('world_boss_scheduler_errors', 'Failed world boss scheduler ticks', scheduler['errors'], []))
+    generator = level_generator.stats()
+    for key in ('generated', 'hits', 'misses'):
+        gauges.append((f'level_generator_{key}', 'Procedural level generator', generator[key], []))
+    images = image_pipeline.stats()
+    for key in ('processed', 'failed'):
+        gauges.append((f'image_variants_{key}', 'Uploads resized by the image pipeline', images[key], []))
+    for phase, seconds in startup_timings.items():
+        gauges.append(('worker_startup_seconds', 'Time spent starting this worker', seconds, [('phase', phase)]))
+    resp = make_response(metrics.render(gauges))
+    resp.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return resp
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,45 @@
+import logging
+import threading
+
+from metrics import SampledLogger
+
+background_log = SampledLogger('worldenderword.background', sample_rate=1.0)
+
+
+class BackgroundLoop:
+    """Runs step() on a daemon thread every interval seconds, one thread per process
+
+    wake() runs the next step right away. start() is cheap enough to call
+    on every request: it only starts a thread when this process has none,
+    e.g. in a freshly forked worker. A step that raises is logged as
+    '<name>_failed' and counted in errors, and the loop carries on.
+    """
+
+    def __init__(self, name, step, interval):
+        self.name = name
+        self.step = step
+        self.interval = interval
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.errors = 0
+
+    def wake(self):
+        self.event.set()
+
+    def _run(self):
+        while True:
+            self.event.wait(self.interval)
+            self.event.clear()
+            try:
+                self.step()
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                background_log.event(f'{self.name}_failed', level=logging.WARNING, error=repr(e))
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self.thread.start()
@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+
+
+class BossStream:
+    """Fan-out of world boss HP updates to Server-Sent Events subscribers
+
+    Only the latest state is kept, tagged with a version number: each
+    subscriber sends whatever is current when it wakes up, so bursts of
+    hits are coalesced and a slow client never builds up a backlog. The
+    event name is worked out per subscriber against the boss it last
+    sent, so a respawn followed by a hit is still a 'respawn'. A
+    single poller thread per worker watches the state shared by all
+    workers (a memory read) so hits landed elsewhere are pushed too.
+    """
+
+    def __init__(self, snapshot, interval=0.1, keepalive=15.0):
+        self.snapshot = snapshot  # () -> (boss_id, health, defeated)
+        self.interval = interval
+        self.keepalive = keepalive
+        self.cond = threading.Condition()
+        self.version = 0
+        self.state = None
+        self.subscribers = 0
+        self.sent = 0
+        self.poller = None
+        self.closed = False
+
+    def publish(self, boss_id, health, defeated):
+        """Record a new state and wake every subscriber; no-op if unchanged"""
+        state = (boss_id, health, defeated)
+        with self.cond:
+            if state == self.state:
+                return
+            self.state = state
+            self.version += 1
+            self.cond.notify_all()
+
+    def _poll(self):
+        while True:
+            with self.cond:
+                while self.subscribers == 0:
+                    self.cond.wait()
+            try:
+                self.publish(*self.snapshot())
+            except Exception:
+                pass  # Keep streaming; the next tick retries
+            time.sleep(self.interval)
+
+    def _ensure_poller(self):
+        with self.cond:
+            if self.poller is None or not self.poller.is_alive():
+                self.poller = threading.Thread(target=self._poll, name='boss-stream', daemon=True)
+                self.poller.start()
+
+    def _next(self, version):
+        """Wait for a version newer than the given one; None on keepalive timeout"""
+        with self.cond:
+            if self.version == version and not self.closed:
+                self.cond.wait(self.keepalive)
+            if self.version == version or self.state is None:
+                return None
+            return self.version, self.state
+
+    def subscribe(self):
+        """Generator of SSE frames for one client"""
+        self._ensure_poller()
+        with self.cond:
+            self.subscribers += 1
+            self.cond.notify_all()  # Wake the poller if it was idle
+        try:
+            version = 0  # The hub's initial, empty version
+            last_boss = None  # Boss this client was last told about
+            yield 'retry: 2000\n\n'
+            while True:
+                update = self._next(version)
+                if self.closed:
+                    return  # The client reconnects, to another worker
+                if update is None:
+                    yield ': keepalive\n\n'
+                    continue
+                version, (boss_id, health, defeated) = update
+                if last_boss is not None and boss_id != last_boss:
+                    event = 'respawn'
+                elif defeated or health <= 0:
+                    event = 'defeated'
+                else:
+                    event = 'hp'
+                last_boss = boss_id
+                data = json.dumps({'boss_id': boss_id, 'health': health, 'defeated': defeated})
+                with self.cond:
+                    self.sent += 1
+                yield f'id: {version}\nevent: {event}\ndata: {data}\n\n'
+        finally:
+            with self.cond:
+                self.subscribers -= 1
+
+    def close(self):
+        """End every stream, e.g. when this worker is shutting down"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {'subscribers': self.subscribers, 'version': self.version, 'sent': self.sent}
@@ -0,0 +1,79 @@
+import threading
+import time
+
+
+class DamageAccumulator:
+    """Buffer world boss hits in memory and write them back to SQLite in batches
+
+    Besides the HP decrement, each flush upserts every player's share of
+    the batch into the world_boss_damage ledger.
+    """
+
+    def __init__(self, flush_every=25, flush_interval=1.0):
+        self.flush_every = flush_every  # Flush after this many hits
+        self.flush_interval = flush_interval  # ...or after this many seconds
+        self.lock = threading.Lock()
+        self.boss_id = None
+        self.pending = 0
+        self.hits = 0
+        self.contributions = {}  # user_id -> [damage, hits]
+        self.last_flush = time.monotonic()
+
+    def track(self, boss_id):
+        """Follow the world boss row currently loaded in memory"""
+        with self.lock:
+            if boss_id != self.boss_id:
+                self.boss_id = boss_id
+                self.pending = 0
+                self.hits = 0
+                self.contributions = {}
+
+    def add(self, damage, user_id=None):
+        """Buffer damage already applied in memory, return True when it's time to flush"""
+        with self.lock:
+            self.pending += damage
+            self.hits += 1
+            if user_id is not None and damage > 0:
+                entry = self.contributions.get(user_id)
+                if entry is None:
+                    self.contributions[user_id] = [damage, 1]
+                else:
+                    entry[0] += damage
+                    entry[1] += 1
+            return (self.hits >= self.flush_every or
+                    time.monotonic() - self.last_flush >= self.flush_interval)
+
+    def flush(self, conn):
+        """Write the summed pending damage with a single atomic decrement"""
+        with self.lock:
+            pending, boss_id, contributions = self.pending, self.boss_id, self.contributions
+            self.pending = 0
+            self.hits = 0
+            self.contributions = {}
+            self.last_flush = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            if boss_id is None:
+                conn.execute("UPDATE world_boss SET health = MAX(health - ?, 0) WHERE status = 'active'", (pending,))
+            else:
+                conn.execute('UPDATE world_boss SET health = MAX(health - ?, 0) WHERE boss_id = ?', (pending, boss_id))
+                if contributions:
+                    conn.executemany('''
+                        INSERT INTO world_boss_damage (boss_id, user_id, damage, hits) VALUES (?, ?, ?, ?)
+                        ON CONFLICT (boss_id, user_id)
+                        DO UPDATE SET damage = damage + excluded.damage, hits = hits + excluded.hits
+                    ''', [(boss_id, user_id, dmg, hits) for user_id, (dmg, hits) in contributions.items()])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # Put the damage back so the next flush retries it
+            with self.lock:
+                if self.boss_id == boss_id:
+                    self.pending += pending
+                    for user_id, (dmg, hits) in contributions.items():
+                        entry = self.contributions.setdefault(user_id, [0, 0])
+                        entry[0] += dmg
+                        entry[1] += hits
+            raise
+        return pending
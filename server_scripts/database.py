@@ -1,11 +1,23 @@
-import sqlite3
-from datetime import datetime
-import os
-import json
-from werkzeug.security import generate_password_hash
+from db_pool import get_pool
+from level_registry import DEFAULT_LEVELS, accepted_letters
+from game_stats import create_stats_table, check as check_stats
+from achievements import create_achievement_tables
+from migration import create_migration_table, migrate_users
 
-def init_db():
-    conn = sqlite3.connect('app.db')
+DATABASE = 'app.db'
+
+def init_db(database=DATABASE):
+    with get_pool(database).connection() as conn:
+        create_tables(conn)
+
+def add_missing_columns(cursor, table, columns):
+    """ALTER TABLE for columns added after a database was created"""
+    existing = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+    for column, definition in columns:
+        if column not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def create_tables(conn):
     cursor = conn.cursor()
     
     # Create users table
@@ -19,6 +31,9 @@ def init_db():
         world_boss_dmg INTEGER DEFAULT 0
     )
     ''')
+    # When world_boss_dmg last changed, so the leaderboard only re-reads recent players
+    add_missing_columns(cursor, 'users', [('world_boss_dmg_at', 'REAL')])
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_world_boss_dmg_at ON users(world_boss_dmg_at)')
     
     # Create profiles table
     cursor.execute('''
@@ -35,6 +50,13 @@ def init_db():
     )
     ''')
     
+    # Resized copies of uploaded images, filled in by the image pipeline
+    add_missing_columns(cursor, 'profiles', [(column, 'TEXT') for column in
+                        ('picture_avatar', 'picture_thumb', 'background_display', 'background_thumb')])
+    # Level the player last entered; level resets keep these
+    add_missing_columns(cursor, 'profiles', [('current_level', 'INTEGER')])
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_profiles_current_level ON profiles(current_level)')
+    
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS world_boss(
         boss_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -45,66 +67,111 @@ def init_db():
         created_at TEXT NOT NULL
     )
     ''')
+    # 'active' is the boss being fought, 'pending' its pre-generated successor
+    add_missing_columns(cursor, 'world_boss', [
+        ('max_health', 'INTEGER'),
+        ('status', "TEXT NOT NULL DEFAULT 'active'"),
+        ('expires_at', 'TEXT'),
+    ])
+    cursor.execute('CREATE INDEX IF NOT EXISTS world_boss_status ON world_boss (status)')
     
-    conn.commit()
-    conn.close()
-
-def migrate_existing_data():
-    conn = sqlite3.connect('app.db')
-    cursor = conn.cursor()
+    # Bosses that died or timed out
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS world_boss_archive(
+        boss_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        health INTEGER NOT NULL,
+        max_health INTEGER,
+        level_model TEXT NOT NULL,
+        key_word TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        ended_at TEXT NOT NULL,
+        outcome TEXT NOT NULL
+    )
+    ''')
+    # Dead rows from before the archive existed: only the newest can still be in play
+    cursor.execute('''
+    INSERT OR IGNORE INTO world_boss_archive
+    SELECT boss_id, name, health, max_health, level_model, key_word, created_at, created_at, 'defeated'
+    FROM world_boss
+    WHERE status = 'active' AND (health <= 0 OR boss_id < (SELECT MAX(boss_id) FROM world_boss WHERE status = 'active'))
+    ''')
+    cursor.execute('''
+    DELETE FROM world_boss WHERE boss_id IN (SELECT boss_id FROM world_boss_archive)
+    ''')
     
-    # Migrate users from users.json
-    if os.path.exists('users.json'):
-        with open('users.json', 'r') as f:
-            users = json.load(f)
-            for username, user_data in users.items():
-                cursor.execute('''
-                INSERT INTO users (username, email, password_hash, created_at)
-                VALUES (?, ?, ?, ?)
-                ''', (username, user_data['email'], user_data['password'], user_data['created_at']))
-                
-                # Get the new user's ID
-                user_id = cursor.lastrowid
-                
-                # Migrate profile data
-                profile_path = f'static/profiles/{username}_profile.json'
-                if os.path.exists(profile_path):
-                    with open(profile_path, 'r') as pf:
-                        profile_data = json.load(pf)
-                        # Read image files as binary data if they exist
-                        picture_data = None
-                        if profile_data.get('picture'):
-                            try:
-                                with open(profile_data['picture'], 'rb') as img_file:
-                                    picture_data = img_file.read()
-                            except:
-                                picture_data = None
-                                
-                        background_image_data = None
-                        if profile_data.get('background_image'):
-                            try:
-                                with open(profile_data['background_image'], 'rb') as img_file:
-                                    background_image_data = img_file.read()
-                            except:
-                                background_image_data = None
-                                
-                        cursor.execute('''
-                        INSERT INTO profiles (user_id, name, description, picture, 
-                                            background_color, background_image)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                        ''', (
-                            user_id,
-                            profile_data.get('name', username),
-                            profile_data.get('description', ''),
-                            picture_data,
-                            profile_data.get('background_color', '#f3f4f6'),
-                            background_image_data
-                        ))
+    # Damage per boss and player, upserted in batches with the HP write-back
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS world_boss_damage(
+        boss_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        damage INTEGER NOT NULL,
+        hits INTEGER NOT NULL,
+        PRIMARY KEY (boss_id, user_id)
+    ) WITHOUT ROWID
+    ''')
+    
+    # Places that moved are upserted from users.world_boss_dmg by the leaderboard
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS leaderboard(
+        leaderboard_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER UNIQUE NOT NULL,
+        place INTEGER NOT NULL,
+        world_boss_dmg INTEGER NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''')
+    add_missing_columns(cursor, 'leaderboard', [('updated_at', 'REAL')])
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_leaderboard_updated_at ON leaderboard(updated_at)')
+    
+    # Levels (Niveau): keyword, fight script, accepted letters, timer, difficulty
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS levels(
+        level_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        fight_script TEXT NOT NULL,
+        accepted_letters TEXT NOT NULL,
+        timer INTEGER NOT NULL DEFAULT 60,
+        difficulty INTEGER NOT NULL DEFAULT 1,
+        background TEXT
+    )
+    ''')
+    
+    # Bumped on every change to levels so servers know when to reload them
+    cursor.execute('CREATE TABLE IF NOT EXISTS level_version(version INTEGER NOT NULL)')
+    cursor.execute('INSERT INTO level_version (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM level_version)')
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS levels_{event.lower()}_version AFTER {event} ON levels
+        BEGIN
+            UPDATE level_version SET version = version + 1;
+        END
+        ''')
+    
+    cursor.executemany('''
+    INSERT OR IGNORE INTO levels (name, fight_script, accepted_letters, timer, difficulty)
+    VALUES (?, ?, ?, ?, ?)
+    ''', [(name, script, accepted_letters(name), timer, difficulty)
+          for name, script, timer, difficulty in DEFAULT_LEVELS])
+    
+    # Player count and difficulty totals, maintained by the app on every change
+    create_stats_table(cursor)
+    # Achievement progress and earned badges
+    create_achievement_tables(cursor)
+    # Checkpoints of the legacy JSON import
+    create_migration_table(cursor)
     
     conn.commit()
-    conn.close()
+
+def migrate_existing_data(database=DATABASE):
+    with get_pool(database).connection() as conn:
+        stats = migrate_users(conn)
+        check_stats(conn, fix=True)  # Bulk inserts bypass the incremental updates
+    return stats
 
 if __name__ == '__main__':
     init_db()
-    migrate_existing_data()
-    print("Database initialized and existing data migrated successfully")
+    stats = migrate_existing_data()
+    print(f"Database initialized and existing data migrated successfully: "
+          f"{stats['users']} users, {stats['profiles']} profiles in {stats['seconds']}s "
+          f"({stats['rows_per_s']} rows/s, {stats['skipped']} already imported)")
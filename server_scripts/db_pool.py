@@ -0,0 +1,133 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Applied to every new connection. WAL lets readers run while a writer holds
+# the lock, and synchronous=NORMAL is safe with WAL (only the last
+# transactions can be lost on power failure, never corrupted).
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',  # ~16MB page cache per connection
+    'PRAGMA mmap_size = 268435456',  # 256MB memory-mapped reads
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA foreign_keys = ON',
+)
+
+
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections shared by request threads"""
+
+    def __init__(self, database, max_size=8, timeout=10, cached_statements=256):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements  # sqlite3's prepared-statement LRU
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.in_use = 0
+        self.acquired = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=self.timeout,
+                               check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """Take a connection, opening a new one while under max_size"""
+        start = time.perf_counter()
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self.lock:
+                if self.created < self.max_size:
+                    self.created += 1
+                    grow = True
+                else:
+                    grow = False
+            if grow:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self.lock:
+                        self.created -= 1
+                    raise
+            else:
+                try:
+                    conn = self.idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise sqlite3.OperationalError('connection pool exhausted')
+                waited = time.perf_counter() - start
+                with self.lock:
+                    self.waits += 1
+                    self.wait_time += waited
+                    self.max_wait = max(self.max_wait, waited)
+        with self.lock:
+            self.in_use += 1
+            self.acquired += 1
+        return conn
+
+    def release(self, conn):
+        """Hand a connection back, dropping any transaction left open"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self.lock:
+                self.in_use -= 1
+                self.created -= 1
+            return
+        with self.lock:
+            self.in_use -= 1
+        self.idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'max_size': self.max_size,
+                'size': self.created,
+                'in_use': self.in_use,
+                'idle': self.created - self.in_use,
+                'acquired': self.acquired,
+                'waits': self.waits,
+                'wait_time_total': round(self.wait_time, 6),
+                'wait_time_max': round(self.max_wait, 6),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database):
+    """Return the pool for a database file, one per path and per process"""
+    key = (os.path.abspath(database), os.getpid())
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            # Connections inherited through fork() must not be reused
+            for stale in [k for k in _pools if k[0] == key[0]]:
+                del _pools[stale]
+            pool = _pools[key] = ConnectionPool(database)
+        return pool
@@ -0,0 +1,122 @@
+import argparse
+import sqlite3
+import threading
+import time
+
+STATS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS stats(
+    stats_id INTEGER PRIMARY KEY CHECK (stats_id = 1),
+    players INTEGER NOT NULL,
+    difficulty_sum INTEGER NOT NULL,
+    difficulty_count INTEGER NOT NULL
+)
+'''
+
+# Aggregates recomputed from scratch: what the stats row must always equal
+RECOMPUTE = '''
+SELECT (SELECT COUNT(*) FROM users),
+       (SELECT COALESCE(SUM(difficulty), 0) FROM profiles),
+       (SELECT COUNT(difficulty) FROM profiles)
+'''
+
+# Profiles start at difficulty 1 (the column default)
+DEFAULT_DIFFICULTY = 1
+
+
+def create_stats_table(cursor):
+    """Create the stats row, seeded from the existing users and profiles"""
+    cursor.execute(STATS_SCHEMA)
+    cursor.execute(f'INSERT INTO stats SELECT 1, * FROM ({RECOMPUTE}) WHERE NOT EXISTS (SELECT 1 FROM stats)')
+
+
+class GameStats:
+    """Player count and difficulty sum/count, kept up to date by the writes that change them
+
+    Each change updates the stats row in the writer's own transaction, so
+    the aggregates never drift from the tables. Reads come from memory and
+    are refreshed from the row at most every max_age seconds, which is how
+    changes made by other workers show up.
+    """
+
+    def __init__(self, max_age=5.0):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.values = None  # (players, difficulty_sum, difficulty_count)
+        self.loaded_at = 0.0
+
+    def _load(self, get_db):
+        now = time.monotonic()
+        with self.lock:
+            if self.values is not None and now - self.loaded_at < self.max_age:
+                return self.values
+        row = get_db().execute('SELECT players, difficulty_sum, difficulty_count FROM stats').fetchone()
+        with self.lock:
+            self.values = tuple(row) if row else (0, 0, 0)
+            self.loaded_at = now
+            return self.values
+
+    def player_count(self, get_db):
+        return self._load(get_db)[0]
+
+    def average_difficulty(self, get_db):
+        """Mean profile difficulty, like AVG(difficulty); None without profiles"""
+        _, total, count = self._load(get_db)
+        return total / count if count else None
+
+    def player_added(self, db, difficulty=DEFAULT_DIFFICULTY):
+        """Count a new user and profile; call inside the transaction that inserts them"""
+        db.execute('''
+            UPDATE stats SET players = players + 1, difficulty_sum = difficulty_sum + ?,
+                             difficulty_count = difficulty_count + 1
+        ''', (difficulty,))
+
+    def difficulty_changed(self, db, user_id, difficulty):
+        """Move a profile's difficulty into the sum; call before updating the profile
+
+        The old value is read by the UPDATE itself, under the write lock,
+        so concurrent changes from other workers cannot be double counted.
+        """
+        db.execute('''
+            UPDATE stats SET
+                difficulty_sum = difficulty_sum + ? - COALESCE((SELECT difficulty FROM profiles WHERE user_id = ?), 0),
+                difficulty_count = difficulty_count + ((SELECT difficulty FROM profiles WHERE user_id = ?) IS NULL)
+        ''', (difficulty, user_id, user_id))
+
+    def invalidate(self):
+        """Reload on the next read, e.g. after committing a change"""
+        with self.lock:
+            self.values = None
+
+
+def check(conn, fix=False):
+    """Recompute the aggregates with full scans and compare them with the stats row
+
+    Returns {name: (stored, actual)} for every mismatch; with fix=True the
+    row is rewritten from the recomputed values.
+    """
+    conn.execute(STATS_SCHEMA)
+    stored = conn.execute('SELECT players, difficulty_sum, difficulty_count FROM stats').fetchone()
+    actual = conn.execute(RECOMPUTE).fetchone()
+    names = ('players', 'difficulty_sum', 'difficulty_count')
+    stored = tuple(stored) if stored else (None, None, None)
+    mismatches = {name: (s, a) for name, s, a in zip(names, stored, actual) if s != a}
+    if fix and mismatches:
+        conn.execute('INSERT OR REPLACE INTO stats VALUES (1, ?, ?, ?)', tuple(actual))
+        conn.commit()
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the stats table against users and profiles')
+    parser.add_argument('--database', default='app.db')
+    parser.add_argument('--fix', action='store_true', help='rewrite the stats row if it is wrong')
+    args = parser.parse_args()
+    conn = sqlite3.connect(args.database, timeout=30)
+    mismatches = check(conn, args.fix)
+    for name, (stored, actual) in mismatches.items():
+        print(f'{name}: stored {stored}, actual {actual}')
+    if not mismatches:
+        print('Stats are consistent')
+    elif args.fix:
+        print('Stats row rewritten')
+    raise SystemExit(1 if mismatches and not args.fix else 0)
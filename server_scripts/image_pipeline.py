@@ -0,0 +1,196 @@
+import importlib.util
+import os
+import struct
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Pillow is optional: uploads are still validated, just not resized. It is
+# imported on the first resize, so a worker that never sees an upload
+# doesn't pay for it at startup.
+HAS_PILLOW = importlib.util.find_spec('PIL') is not None
+
+CHUNK_SIZE = 64 * 1024
+HEADER_LIMIT = 512 * 1024  # JPEG EXIF can push the size marker this far
+
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+JPEG_MAGIC = b'\xff\xd8'
+
+
+class InvalidImage(ValueError):
+    """Upload is not a PNG/JPEG we are willing to process"""
+
+
+class UploadTooLarge(InvalidImage):
+    """Upload exceeds the byte or pixel budget"""
+
+
+def read_dimensions(header):
+    """Return (format, width, height) from the start of a file, or None if more bytes are needed"""
+    if header.startswith(PNG_MAGIC):
+        if len(header) < 24:
+            return None
+        width, height = struct.unpack('>II', header[16:24])
+        return 'png', width, height
+    if header.startswith(JPEG_MAGIC):
+        pos = 2
+        while pos + 4 <= len(header):
+            if header[pos] != 0xFF:
+                raise InvalidImage('Corrupt JPEG')
+            marker = header[pos + 1]
+            if marker == 0xFF:  # Fill byte
+                pos += 1
+                continue
+            length = struct.unpack('>H', header[pos + 2:pos + 4])[0]
+            # SOFn markers hold the frame size (C4, C8 and CC are not frames)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                if pos + 9 > len(header):
+                    return None
+                height, width = struct.unpack('>HH', header[pos + 5:pos + 9])
+                return 'jpeg', width, height
+            pos += 2 + length
+        return None
+    if len(header) >= len(PNG_MAGIC):
+        raise InvalidImage('Only PNG and JPEG images are accepted')
+    return None
+
+
+class ImageUpload:
+    """Writable temp file for one uploaded image, checked as the bytes arrive
+
+    Handed to the multipart parser as its file stream, so an upload that
+    is too big or not a PNG/JPEG is rejected on the chunk that gives it
+    away instead of after the whole body was read. A rejected write
+    records the error, deletes the file and raises; werkzeug swallows
+    parser errors, so the caller looks at `error`. Unless finish() was
+    called, close() deletes the file.
+    """
+
+    def __init__(self, directory, max_bytes, max_pixels):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.upload')
+        self.file = os.fdopen(fd, 'w+b')
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.header = b''
+        self.info = None
+        self.written = 0
+        self.error = None
+        self.kept = False
+
+    def _check(self, chunk):
+        self.written += len(chunk)
+        if self.written > self.max_bytes:
+            raise UploadTooLarge(f'Image is larger than {self.max_bytes // (1024 * 1024)}MB')
+        if self.info is None:
+            self.header += chunk
+            self.info = read_dimensions(self.header)
+            if self.info is None and len(self.header) > HEADER_LIMIT:
+                raise InvalidImage('Could not read image dimensions')
+            if self.info is not None:
+                self.header = b''
+                _, width, height = self.info
+                if width * height > self.max_pixels or not width or not height:
+                    raise UploadTooLarge(f'Image is {width}x{height}, too many pixels')
+
+    def write(self, chunk):
+        if self.error is not None:
+            raise self.error
+        try:
+            self._check(chunk)
+        except InvalidImage as e:
+            self.error = e
+            self.close()
+            raise
+        return self.file.write(chunk)
+
+    def finish(self):
+        """Return (temp_path, format, width, height); the caller moves or deletes the file"""
+        if self.error is not None:
+            raise self.error
+        if self.info is None:
+            self.close()
+            raise InvalidImage('Could not read image dimensions')
+        self.file.close()
+        self.kept = True
+        return (self.path,) + self.info
+
+    def close(self):
+        self.file.close()
+        if not self.kept:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)  # seek/read/readline for werkzeug's FileStorage
+
+
+def variant_path(original, variant):
+    stem, ext = os.path.splitext(original)
+    return f'{stem}.{variant}{ext}'
+
+
+def _resize(src, dest, size, crop):
+    from PIL import Image, ImageOps
+    with Image.open(src) as im:
+        im.draft('RGB', size)  # Let JPEG decode at a reduced scale
+        im = ImageOps.exif_transpose(im)
+        if crop:
+            im = ImageOps.fit(im, size, Image.LANCZOS)
+        else:
+            im.thumbnail(size, Image.LANCZOS)
+        # Write next to the target and rename, so readers never see half a file
+        tmp = f'{dest}.{threading.get_ident()}.tmp'
+        if dest.lower().endswith(('.jpg', '.jpeg')):
+            im.convert('RGB').save(tmp, 'JPEG', quality=85, optimize=True, progressive=True)
+        else:
+            im.save(tmp, 'PNG', optimize=True)
+    os.replace(tmp, dest)
+
+
+class ImagePipeline:
+    """Builds fixed-size variants of uploaded images on a background pool
+
+    specs maps a variant name to ((width, height), crop). on_done(variants)
+    is called from the worker with {name: path} once all variants exist.
+    """
+
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
+        self.executor = None
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+
+    def _pool(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='images')
+            return self.executor
+
+    def submit(self, original, specs, on_done):
+        if not HAS_PILLOW:
+            return None
+        return self._pool().submit(self._run, original, specs, on_done)
+
+    def _run(self, original, specs, on_done):
+        try:
+            variants = {}
+            for name, (size, crop) in specs.items():
+                dest = variant_path(original, name)
+                if not os.path.exists(dest):  # Same upload seen before
+                    _resize(original, dest, size, crop)
+                variants[name] = dest
+            on_done(variants)
+            with self.lock:
+                self.processed += 1
+        except Exception:
+            with self.lock:
+                self.failed += 1
+            raise
+
+    def stats(self):
+        with self.lock:
+            return {'enabled': HAS_PILLOW, 'processed': self.processed, 'failed': self.failed}
@@ -0,0 +1,267 @@
+import random
+import threading
+import time
+
+from background import BackgroundLoop
+
+MAX_LEVEL = 24
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, level):
+        self.key = key
+        self.next = [None] * level
+        self.width = [1] * level  # Bottom-level steps to next[i]
+
+
+class IndexableSkipList:
+    """Sorted keys with O(log n) insert, remove, rank and positional access"""
+
+    def __init__(self):
+        self.head = _Node(None, MAX_LEVEL)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _random_level(self):
+        level = 1
+        while level < MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        return level
+
+    def _find(self, key):
+        """Return the last node before key on every level and its position"""
+        update = [None] * MAX_LEVEL
+        steps = [0] * MAX_LEVEL
+        x, pos = self.head, 0
+        for i in reversed(range(MAX_LEVEL)):
+            while x.next[i] is not None and x.next[i].key < key:
+                pos += x.width[i]
+                x = x.next[i]
+            update[i] = x
+            steps[i] = pos
+        return update, steps
+
+    def insert(self, key):
+        update, steps = self._find(key)
+        level = self._random_level()
+        node = _Node(key, level)
+        new_pos = steps[0] + 1
+        for i in range(MAX_LEVEL):
+            prev = update[i]
+            if i < level:
+                node.next[i] = prev.next[i]
+                prev.next[i] = node
+                node.width[i] = prev.width[i] - (new_pos - steps[i]) + 1
+                prev.width[i] = new_pos - steps[i]
+            else:
+                prev.width[i] += 1
+        self.size += 1
+
+    def remove(self, key):
+        update, _ = self._find(key)
+        target = update[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for i in range(MAX_LEVEL):
+            prev = update[i]
+            if prev.next[i] is target:
+                prev.width[i] += target.width[i] - 1
+                prev.next[i] = target.next[i]
+            else:
+                prev.width[i] -= 1
+        self.size -= 1
+
+    def rank(self, key):
+        """0-based position of key"""
+        update, steps = self._find(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        return steps[0]
+
+    def slice(self, start, count):
+        """Return up to count keys starting at 0-based position start"""
+        if start >= self.size or count <= 0:
+            return []
+        x, pos, target = self.head, 0, start + 1
+        for i in reversed(range(MAX_LEVEL)):
+            while x.next[i] is not None and pos + x.width[i] <= target:
+                pos += x.width[i]
+                x = x.next[i]
+        keys = []
+        while x is not None and len(keys) < count:
+            keys.append(x.key)
+            x = x.next[0]
+        return keys
+
+
+class Leaderboard:
+    """World boss damage ranking kept in memory and persisted in the background
+
+    Hits are credited in memory right away and summed per user. A thread
+    per worker periodically adds the sums to users.world_boss_dmg, stamped
+    with world_boss_dmg_at, then reads back only the users stamped since
+    its previous round, so credits from other workers show up, and
+    upserts the leaderboard rows whose place or damage changed. Rows are
+    stamped too, so a worker doesn't redo places another one just wrote.
+    """
+
+    # Re-read rows stamped this long before the newest one seen, for writes that committed late
+    SLACK = 5.0
+
+    def __init__(self, persist_interval=30.0):
+        self.lock = threading.Lock()
+        self.ranks = IndexableSkipList()  # keys are (-damage, user_id)
+        self.scores = {}  # user_id -> damage
+        self.names = {}  # user_id -> username
+        self.pending = {}  # user_id -> damage not yet written to users
+        self.stored = {}  # user_id -> users.world_boss_dmg as last read
+        self.written = {}  # user_id -> (place, damage) as in the leaderboard table
+        self.since = 0.0  # Newest world_boss_dmg_at read so far
+        self.places_since = 0.0  # Newest leaderboard.updated_at read so far
+        self.loaded = False
+        self.connect = None
+        # A failed round is usually the write lock timing out; its damage was
+        # put back in pending and its places are still out of date, so the
+        # next round writes both
+        self.loop = BackgroundLoop('leaderboard_persist', self._persist, persist_interval)
+
+    def _set_score(self, user_id, score):
+        old = self.scores.get(user_id)
+        if old is not None:
+            self.ranks.remove((-old, user_id))
+        self.scores[user_id] = score
+        self.ranks.insert((-score, user_id))
+
+    def _apply(self, rows):
+        """Take the stored damage of (user_id, username, world_boss_dmg, world_boss_dmg_at) rows"""
+        for user_id, username, dmg, stamped in rows:
+            self.names[user_id] = username
+            self.stored[user_id] = dmg
+            self._set_score(user_id, dmg + self.pending.get(user_id, 0))
+            self.since = max(self.since, stamped or 0.0)
+
+    def _apply_places(self, rows):
+        for user_id, place, dmg, stamped in rows:
+            self.written[user_id] = (place, dmg)
+            self.places_since = max(self.places_since, stamped or 0.0)
+
+    def load(self, conn):
+        """Build the ranking from users.world_boss_dmg; done once per worker"""
+        rows = conn.execute('''
+            SELECT user_id, username, world_boss_dmg, world_boss_dmg_at FROM users WHERE world_boss_dmg > 0
+        ''').fetchall()
+        places = conn.execute('SELECT user_id, place, world_boss_dmg, updated_at FROM leaderboard').fetchall()
+        with self.lock:
+            self.ranks = IndexableSkipList()
+            self.scores = {}
+            self.stored = {}
+            self._apply(rows)
+            for user_id, dmg in self.pending.items():
+                if user_id not in self.scores:
+                    self._set_score(user_id, dmg)
+            self.written = {}
+            self._apply_places(places)
+            self.loaded = True
+
+    def refresh(self, conn):
+        """Pick up the damage written since the previous round, by any worker"""
+        rows = conn.execute('''
+            SELECT user_id, username, world_boss_dmg, world_boss_dmg_at FROM users
+            WHERE world_boss_dmg_at >= ? AND world_boss_dmg > 0
+        ''', (self.since - self.SLACK,)).fetchall()
+        places = conn.execute('''
+            SELECT user_id, place, world_boss_dmg, updated_at FROM leaderboard WHERE updated_at >= ?
+        ''', (self.places_since - self.SLACK,)).fetchall()
+        with self.lock:
+            self._apply(rows)
+            self._apply_places(places)
+
+    def credit(self, user_id, username, damage):
+        """Add damage dealt by a player to the world boss"""
+        if damage <= 0:
+            return
+        with self.lock:
+            self.names[user_id] = username
+            self.pending[user_id] = self.pending.get(user_id, 0) + damage
+            self._set_score(user_id, self.scores.get(user_id, 0) + damage)
+
+    def top(self, n):
+        """Return the n best players as dicts, best first"""
+        with self.lock:
+            keys = self.ranks.slice(0, n)
+            return [{'rank': i + 1, 'username': self.names.get(user_id), 'damage': -neg}
+                    for i, (neg, user_id) in enumerate(keys)]
+
+    def rank_of(self, user_id):
+        """Return (1-based rank, damage), or (None, 0) for players without damage"""
+        with self.lock:
+            score = self.scores.get(user_id)
+            if score is None:
+                return None, 0
+            return self.ranks.rank((-score, user_id)) + 1, score
+
+    def size(self):
+        with self.lock:
+            return len(self.ranks)
+
+    def _changed_places(self):
+        """(user_id, place, damage) rows that differ from the table, ranked on stored damage"""
+        with self.lock:
+            stored = sorted(self.stored.items(), key=lambda item: (-item[1], item[0]))
+            written = self.written
+        return [(user_id, place, dmg) for place, (user_id, dmg) in enumerate(stored, 1)
+                if written.get(user_id) != (place, dmg)]
+
+    def persist(self, conn):
+        """Write pending damage, read back what changed and upsert the places that moved"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        try:
+            if pending:
+                now = time.time()
+                conn.executemany('''
+                    UPDATE users SET world_boss_dmg = world_boss_dmg + ?, world_boss_dmg_at = ? WHERE user_id = ?
+                ''', [(dmg, now, user_id) for user_id, dmg in pending.items()])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # Keep the damage for the next attempt
+            with self.lock:
+                for user_id, dmg in pending.items():
+                    self.pending[user_id] = self.pending.get(user_id, 0) + dmg
+            raise
+        if self.loaded:
+            self.refresh(conn)
+        else:
+            self.load(conn)
+        changed = self._changed_places()
+        if not changed:
+            return 0
+        try:
+            now = time.time()
+            conn.executemany('''
+                INSERT INTO leaderboard (user_id, place, world_boss_dmg, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE
+                SET place = excluded.place, world_boss_dmg = excluded.world_boss_dmg, updated_at = excluded.updated_at
+            ''', [row + (now,) for row in changed])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        with self.lock:
+            self.written.update((user_id, (place, dmg)) for user_id, place, dmg in changed)
+        return len(changed)
+
+    def _persist(self):
+        with self.connect() as conn:
+            self.persist(conn)
+
+    def start(self, connect):
+        """Start this worker's persist thread if it isn't running"""
+        self.connect = connect
+        self.loop.start()
@@ -0,0 +1,115 @@
+import hashlib
+import multiprocessing
+import random
+import string
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from ttl_cache import TTLCache
+
+# Background grid, in letters
+GRID_COLUMNS = 48
+GRID_ROWS = 27
+CELL = 40
+
+
+def level_seed(name):
+    """Stable seed for a level name, identical across processes and restarts"""
+    return int.from_bytes(hashlib.sha256(name.encode('utf-8')).digest()[:8], 'big')
+
+
+def generate_level(name, scripts):
+    """Build a level for an unknown word; same name and scripts give the same level
+
+    Runs in a worker process, so it only takes and returns plain data.
+    """
+    rng = random.Random(level_seed(name))
+    letters = ''.join(sorted(set(name)))
+    fight_script = rng.choice(sorted(scripts))
+    timer = rng.randrange(30, 91, 5)
+    difficulty = min(10, max(1, len(letters) // 2 + rng.randint(0, 2)))
+    return {
+        'name': name,
+        'fight_script': fight_script,
+        'accepted_letters': letters,
+        'timer': timer,
+        'difficulty': difficulty,
+        'background_svg': render_background(rng, letters),
+    }
+
+
+def render_background(rng, letters):
+    """SVG grid of decoy letters with the accepted letters hidden among them"""
+    hue = rng.randrange(360)
+    decoys = [c for c in string.ascii_lowercase if c not in letters] or list(string.ascii_lowercase)
+    hidden = {}
+    for c in letters:
+        hidden[(rng.randrange(GRID_COLUMNS), rng.randrange(GRID_ROWS))] = c
+    width, height = GRID_COLUMNS * CELL, GRID_ROWS * CELL
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+        f'<rect width="100%" height="100%" fill="hsl({hue},35%,12%)"/>',
+        '<g font-family="monospace" font-size="28" text-anchor="middle">',
+    ]
+    for row in range(GRID_ROWS):
+        for col in range(GRID_COLUMNS):
+            c = hidden.get((col, row)) or rng.choice(decoys)
+            # Accepted letters get a slightly brighter shade: findable, not obvious
+            light = 30 if (col, row) in hidden else rng.randrange(18, 27)
+            x = col * CELL + CELL // 2 + rng.randint(-4, 4)
+            y = row * CELL + CELL - 8 + rng.randint(-4, 4)
+            parts.append(f'<text x="{x}" y="{y}" fill="hsl({hue},40%,{light}%)">{c}</text>')
+    parts.append('</g></svg>')
+    return ''.join(parts)
+
+
+class LevelGenerator:
+    """Generates unknown levels in a process pool and memoizes the results
+
+    Concurrent requests for the same word share one in-flight generation.
+    """
+
+    def __init__(self, max_workers=2, memo_size=4096):
+        self.max_workers = max_workers
+        self.memo = TTLCache(max_size=memo_size, ttl=24 * 3600)
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.executor = None
+        self.generated = 0
+
+    def _pool(self):
+        if self.executor is None:
+            # spawn: workers only import this module, not the Flask app
+            self.executor = ProcessPoolExecutor(self.max_workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        return self.executor
+
+    def get(self, name, scripts, timeout=10):
+        key = (name, tuple(sorted(scripts)))
+        level = self.memo.get(key)
+        if level is not None:
+            return level
+        with self.lock:
+            future = self.inflight.get(key)
+            if future is None:
+                future = self.inflight[key] = self._pool().submit(generate_level, name, key[1])
+                self.generated += 1
+        try:
+            level = future.result(timeout)
+        finally:
+            with self.lock:
+                if self.inflight.get(key) is future and future.done():
+                    del self.inflight[key]
+        self.memo.set(key, level)
+        return level
+
+    def stats(self):
+        stats = self.memo.stats()
+        stats['generated'] = self.generated
+        stats['inflight'] = len(self.inflight)
+        return stats
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,98 @@
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# One row of the levels table (the README's Niveau table)
+Level = namedtuple('Level', 'level_id name fight_script accepted_letters timer difficulty background')
+
+# Built-in levels, used to seed the table and when it doesn't exist yet
+DEFAULT_LEVELS = (
+    ('conquest', 'fight_1', 60, 1),
+    ('despair', 'fight_2', 60, 2),
+    ('hunt', 'fight_3', 60, 3),
+    ('blood', 'fight_4', 60, 4),
+)
+DEFAULT_KEY_WORD = 'conquest'
+
+
+def accepted_letters(word):
+    """Letters a player can type to spell the level keyword"""
+    return ''.join(sorted(set(word.lower())))
+
+
+class LevelRegistry:
+    """In-memory index of the levels table, keyed by fight script and name
+
+    The table carries a version counter bumped by triggers, so refresh()
+    only reloads when a level was added, changed or removed, and checks
+    for that at most once every check_interval seconds.
+    """
+
+    def __init__(self, check_interval=5.0):
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.version = None
+        self.last_check = 0.0
+        self._install([Level(i + 1, name, script, accepted_letters(name), timer, difficulty, None)
+                       for i, (name, script, timer, difficulty) in enumerate(DEFAULT_LEVELS)])
+
+    def _install(self, levels):
+        by_script = {}
+        for level in levels:
+            by_script.setdefault(level.fight_script, level)  # Lowest id wins
+        # Swap whole objects so readers never see a half-built index
+        self.by_script = by_script
+        self.by_name = {level.name: level for level in levels}
+        self.scripts = tuple(by_script)
+        # Keywords of the fight scripts' own levels, not generated ones
+        self.words = tuple(level.name for level in by_script.values())
+
+    def load(self, conn):
+        """Rebuild the index from the database"""
+        with self.lock:
+            try:
+                version = conn.execute('SELECT version FROM level_version').fetchone()[0]
+                rows = conn.execute('''
+                    SELECT level_id, name, fight_script, accepted_letters, timer, difficulty, background
+                    FROM levels ORDER BY level_id
+                ''').fetchall()
+            except sqlite3.OperationalError:
+                # Tables not created yet, keep the built-in levels
+                self.version = 0
+                return
+            if rows:
+                self._install([Level(*row) for row in rows])
+            self.version = version
+
+    def refresh(self, get_conn):
+        """Reload if the table changed since the last check"""
+        now = time.monotonic()
+        if self.version is not None and now - self.last_check < self.check_interval:
+            return
+        self.last_check = now
+        conn = get_conn()
+        try:
+            version = conn.execute('SELECT version FROM level_version').fetchone()[0]
+        except sqlite3.OperationalError:
+            version = 0
+        if version != self.version:
+            self.load(conn)
+
+    def add(self, level):
+        """Make a level created by this process visible before the next reload"""
+        with self.lock:
+            by_name = dict(self.by_name)
+            by_name[level.name] = level
+            self._install(sorted(by_name.values(), key=lambda l: l.level_id))
+
+    def get(self, fight_script):
+        return self.by_script.get(fight_script)
+
+    def get_by_name(self, name):
+        return self.by_name.get(name)
+
+    def key_word(self, fight_script):
+        """Keyword that defeats the boss of a fight script"""
+        level = self.by_script.get(fight_script)
+        return level.name if level else DEFAULT_KEY_WORD
@@ -0,0 +1,169 @@
+import argparse
+import os
+import signal
+import threading
+import time
+
+from level_registry import DEFAULT_LEVELS
+
+
+class LevelReset:
+    """Deletes every level no player is on, a small batch per transaction
+
+    The set of levels to keep (each fight script's own level, the default
+    levels and every profiles.current_level) is read once. The table is
+    then walked by level_id up to the highest id seen at the start, so
+    levels generated meanwhile survive; each batch re-checks
+    profiles.current_level inside its DELETE, so a player who moved onto
+    a level after the start keeps it. The write lock is held for one batch
+    at a time and released for at least `pause` seconds in between, which
+    lets combat writes through. Rate, pause and resume can be changed while
+    it runs.
+    """
+
+    def __init__(self, connect, batch_size=500, pause=0.05, max_rate=None, backgrounds=None):
+        self.connect = connect  # () -> context manager yielding a connection
+        self.batch_size = batch_size
+        self.pause = pause
+        self.max_rate = max_rate  # Levels scanned per second, None for no limit
+        self.backgrounds = backgrounds  # Folder of generated backgrounds to clean up
+        self.running = threading.Event()
+        self.running.set()
+        self.stopped = False
+        self.lock = threading.Lock()
+        self.progress = {'state': 'idle', 'total': 0, 'scanned': 0, 'deleted': 0, 'kept': 0,
+                         'batches': 0, 'lock_seconds': 0.0, 'elapsed': 0.0, 'last_id': 0}
+
+    def _update(self, **fields):
+        with self.lock:
+            self.progress.update(fields)
+
+    def status(self):
+        with self.lock:
+            progress = dict(self.progress)
+        progress['percent'] = round(100.0 * progress['scanned'] / progress['total'], 1) if progress['total'] else 100.0
+        progress['rate'] = round(progress['scanned'] / progress['elapsed'], 1) if progress['elapsed'] else 0.0
+        return progress
+
+    def pause_job(self):
+        self.running.clear()
+        self._update(state='paused')
+
+    def resume_job(self):
+        self._update(state='running')
+        self.running.set()
+
+    def stop(self):
+        self.stopped = True
+        self.running.set()
+
+    def keep_set(self, conn):
+        """Level ids that must survive the reset"""
+        keep = {row[0] for row in conn.execute('SELECT MIN(level_id) FROM levels GROUP BY fight_script')}
+        names = [name for name, _, _, _ in DEFAULT_LEVELS]
+        keep.update(row[0] for row in conn.execute(
+            f"SELECT level_id FROM levels WHERE name IN ({','.join('?' * len(names))})", names))
+        keep.update(row[0] for row in conn.execute(
+            'SELECT DISTINCT current_level FROM profiles WHERE current_level IS NOT NULL'))
+        return keep
+
+    def _delete_batch(self, conn, ids):
+        """Delete ids no player is on in one short transaction; returns the deleted rows"""
+        placeholders = ','.join('?' * len(ids))
+        start = time.perf_counter()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(f'''
+                SELECT level_id, background FROM levels
+                WHERE level_id IN ({placeholders})
+                AND NOT EXISTS (SELECT 1 FROM profiles WHERE current_level = levels.level_id)
+            ''', ids).fetchall()
+            if rows:
+                conn.execute(f"DELETE FROM levels WHERE level_id IN ({','.join('?' * len(rows))})",
+                             [row[0] for row in rows])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        with self.lock:
+            self.progress['lock_seconds'] += time.perf_counter() - start
+        return rows
+
+    def _remove_backgrounds(self, rows):
+        if not self.backgrounds:
+            return
+        for _, background in rows:
+            if background and background.startswith('/static/generated_levels/'):
+                try:
+                    os.remove(os.path.join(self.backgrounds, os.path.basename(background)))
+                except FileNotFoundError:
+                    pass
+
+    def run(self):
+        """Run to completion (or stop()); returns the final status"""
+        start = time.perf_counter()
+        with self.connect() as conn:
+            if conn.in_transaction:
+                conn.commit()
+            keep = self.keep_set(conn)
+            last_id, max_id = conn.execute(
+                'SELECT COALESCE(MIN(level_id) - 1, 0), COALESCE(MAX(level_id), 0) FROM levels').fetchone()
+            total = conn.execute('SELECT COUNT(*) FROM levels').fetchone()[0]
+            self._update(state='running' if self.running.is_set() else 'paused', total=total, last_id=last_id)
+            while not self.stopped:
+                self.running.wait()
+                if self.stopped:
+                    break
+                batch_start = time.perf_counter()
+                ids = [row[0] for row in conn.execute(
+                    'SELECT level_id FROM levels WHERE level_id > ? AND level_id <= ? ORDER BY level_id LIMIT ?',
+                    (last_id, max_id, self.batch_size))]
+                if not ids:
+                    break
+                last_id = ids[-1]
+                candidates = [i for i in ids if i not in keep]
+                rows = self._delete_batch(conn, candidates) if candidates else []
+                self._remove_backgrounds(rows)
+                with self.lock:
+                    p = self.progress
+                    p['scanned'] += len(ids)
+                    p['deleted'] += len(rows)
+                    p['kept'] += len(ids) - len(rows)
+                    p['batches'] += 1
+                    p['last_id'] = last_id
+                    p['elapsed'] = time.perf_counter() - start
+                # Yield the write lock, and hold the scan to max_rate
+                wait = self.pause
+                if self.max_rate:
+                    wait = max(wait, len(ids) / self.max_rate - (time.perf_counter() - batch_start))
+                time.sleep(wait)
+        self._update(state='stopped' if self.stopped else 'done', elapsed=time.perf_counter() - start)
+        return self.status()
+
+
+if __name__ == '__main__':
+    from db_pool import get_pool
+
+    parser = argparse.ArgumentParser(description='Delete every level no player is on, without blocking the game')
+    parser.add_argument('--database', default='app.db')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--pause', type=float, default=0.05, help='seconds between batches')
+    parser.add_argument('--max-rate', type=float, help='levels scanned per second')
+    parser.add_argument('--backgrounds', help='folder of generated level backgrounds to clean up',
+                        default=os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static', 'generated_levels')))
+    args = parser.parse_args()
+
+    job = LevelReset(lambda: get_pool(args.database).connection(), args.batch_size, args.pause,
+                     args.max_rate, args.backgrounds)
+    # kill -USR1 pauses, kill -USR2 resumes, Ctrl-C stops after the current batch
+    signal.signal(signal.SIGUSR1, lambda signum, frame: job.pause_job())
+    signal.signal(signal.SIGUSR2, lambda signum, frame: job.resume_job())
+    signal.signal(signal.SIGINT, lambda signum, frame: job.stop())
+    worker = threading.Thread(target=job.run)
+    worker.start()
+    while worker.is_alive():
+        worker.join(1.0)
+        s = job.status()
+        print(f"{s['state']:>8} {s['percent']:5.1f}%  scanned {s['scanned']}/{s['total']}  "
+              f"deleted {s['deleted']}  kept {s['kept']}  {s['rate']:.0f} levels/s  "
+              f"write lock {s['lock_seconds']:.2f}s", flush=True)
@@ -0,0 +1,118 @@
+import json
+import marshal
+import os
+import threading
+import unicodedata
+
+SNAPSHOT_VERSION = 1
+_END = ''  # Trie key marking a complete word, never a real character
+
+
+def normalize(word):
+    """Lowercase and strip accents so 'Décéder' and 'deceder' match"""
+    decomposed = unicodedata.normalize('NFKD', word.strip())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def _fingerprint(sources):
+    fp = []
+    for path in sources:
+        st = os.stat(path)
+        fp.append((os.path.abspath(path), st.st_size, st.st_mtime_ns))
+    return fp
+
+
+class Lexicon:
+    """Trie from every known word (and synonym) to its canonical level
+
+    Sources use the words.json layout: {"level": {"word": [synonyms...]}}.
+    Lookups walk one trie node per character, so resolving a word costs
+    O(len(word)) however many dictionaries are loaded.
+    """
+
+    def __init__(self, trie, levels):
+        self.trie = trie
+        self.levels = levels  # Canonical level names, indexed by the trie
+
+    @classmethod
+    def build(cls, sources):
+        trie = {}
+        levels = []
+        index = {}
+        for path in sources:
+            with open(path, encoding='utf-8') as f:
+                entries = json.load(f)
+            for level, data in entries.items():
+                if level not in index:
+                    index[level] = len(levels)
+                    levels.append(level)
+                for word in [level] + list(data.get('word', [])):
+                    node = trie
+                    for c in normalize(word):
+                        node = node.setdefault(c, {})
+                    node.setdefault(_END, index[level])  # First source wins
+        return cls(trie, levels)
+
+    @classmethod
+    def load(cls, sources, snapshot_path):
+        """Load from the binary snapshot, rebuilding it if a source changed"""
+        fp = _fingerprint(sources)
+        try:
+            with open(snapshot_path, 'rb') as f:
+                version, snap_fp, trie, levels = marshal.load(f)
+            if version == SNAPSHOT_VERSION and snap_fp == fp:
+                return cls(trie, levels)
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+        lexicon = cls.build(sources)
+        tmp_path = f'{snapshot_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                marshal.dump((SNAPSHOT_VERSION, fp, lexicon.trie, lexicon.levels), f)
+            os.replace(tmp_path, snapshot_path)
+        except OSError:
+            pass  # A read-only disk only costs a rebuild on next start
+        return lexicon
+
+    def _node(self, normalized):
+        node = self.trie
+        for c in normalized:
+            node = node.get(c)
+            if node is None:
+                return None
+        return node
+
+    def resolve(self, word):
+        """Return the canonical level for a word or synonym, or None"""
+        node = self._node(normalize(word))
+        if node is None or _END not in node:
+            return None
+        return self.levels[node[_END]]
+
+    def complete(self, prefix, limit=5):
+        """Return up to limit canonical levels reachable from a typed prefix"""
+        node = self._node(normalize(prefix))
+        found = []
+        stack = [node] if node is not None else []
+        while stack and len(found) < limit:
+            node = stack.pop()
+            if _END in node:
+                level = self.levels[node[_END]]
+                if level not in found:
+                    found.append(level)
+            stack.extend(child for c, child in node.items() if c != _END)
+        return found
+
+
+_lexicon = None
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon(sources, snapshot_path):
+    """Process-wide lexicon, loaded on first use"""
+    global _lexicon
+    if _lexicon is None:
+        with _lexicon_lock:
+            if _lexicon is None:
+                _lexicon = Lexicon.load(sources, snapshot_path)
+    return _lexicon
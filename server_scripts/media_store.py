@@ -0,0 +1,45 @@
+import hashlib
+import os
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+# <sha256>[.<variant>].<ext>, the only names the store hands out
+MEDIA_NAME = re.compile(r'^[0-9a-f]{64}(\.[a-z]+)?\.[a-z0-9]+$')
+
+
+class MediaStore:
+    """Content-addressed blob store: a file's name is the SHA-256 of its bytes
+
+    Identical uploads share one file, and since a name never changes
+    meaning it can be cached forever. Files are spread over 256
+    subdirectories by the first two hex digits.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name):
+        """Filesystem path for a media name, or None if the name is not one of ours"""
+        if not MEDIA_NAME.match(name):
+            return None
+        return os.path.join(self.root, name[:2], name)
+
+    def put(self, temp_path, ext):
+        """Move a finished temp file into the store and return its name
+
+        If the content is already stored the temp file is dropped.
+        """
+        digest = hashlib.sha256()
+        with open(temp_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        name = f'{digest.hexdigest()}.{ext}'
+        dest = self.path(name)
+        if os.path.exists(dest):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(temp_path, dest)
+        return name
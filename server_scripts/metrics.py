@@ -0,0 +1,213 @@
+import json
+import logging
+import random
+import re
+import threading
+import time
+
+# Latency buckets in seconds, Prometheus style (each bucket counts values <= le)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+_SQL_VERB = re.compile(r'^\s*(\w+)', re.I)
+_SQL_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+(\w+)', re.I)
+
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, le in enumerate(self.buckets):
+            if value <= le:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        out = []
+        cumulative = 0
+        for le, n in zip(self.buckets, self.counts):
+            cumulative += n
+            out.append(f'{name}_bucket{_labels(labels, le=_num(le))} {cumulative}')
+        out.append(f'{name}_bucket{_labels(labels, le="+Inf")} {self.count}')
+        out.append(f'{name}_sum{_labels(labels)} {_num(self.sum)}')
+        out.append(f'{name}_count{_labels(labels)} {self.count}')
+        return out
+
+
+def _num(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + '}'
+
+
+_statement_keys = {}
+
+
+def statement_key(sql):
+    """Low-cardinality label for a statement, e.g. 'UPDATE world_boss'"""
+    key = _statement_keys.get(sql)
+    if key is None:
+        verb = _SQL_VERB.search(sql)
+        table = _SQL_TABLE.search(sql)
+        key = verb.group(1).upper() if verb else 'OTHER'
+        if table:
+            key += ' ' + table.group(1)
+        if len(_statement_keys) < 1024:
+            _statement_keys[sql] = key
+    return key
+
+
+class Metrics:
+    """Per-process request and SQL metrics, rendered as Prometheus text"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}  # (endpoint, method) -> Histogram
+        self.responses = {}  # (endpoint, method, status) -> count
+        self.statements = {}  # statement key -> Histogram
+        self.statements_per_request = Histogram(COUNT_BUCKETS)
+        self.sql_time_per_request = Histogram(LATENCY_BUCKETS)
+
+    def observe_request(self, endpoint, method, status, seconds, sql_count, sql_seconds):
+        with self.lock:
+            key = (endpoint or 'unknown', method)
+            hist = self.requests.get(key)
+            if hist is None:
+                hist = self.requests[key] = Histogram(LATENCY_BUCKETS)
+            hist.observe(seconds)
+            rkey = key + (status,)
+            self.responses[rkey] = self.responses.get(rkey, 0) + 1
+            self.statements_per_request.observe(sql_count)
+            self.sql_time_per_request.observe(sql_seconds)
+
+    def observe_statement(self, sql, seconds):
+        key = statement_key(sql)
+        with self.lock:
+            hist = self.statements.get(key)
+            if hist is None:
+                hist = self.statements[key] = Histogram(LATENCY_BUCKETS)
+            hist.observe(seconds)
+
+    def render(self, gauges=()):
+        """Prometheus text exposition; gauges are (name, help, value, labels) tuples"""
+        out = []
+        with self.lock:
+            out.append('# HELP http_request_duration_seconds Request latency by endpoint')
+            out.append('# TYPE http_request_duration_seconds histogram')
+            for (endpoint, method), hist in sorted(self.requests.items()):
+                out.extend(hist.lines('http_request_duration_seconds',
+                                      [('endpoint', endpoint), ('method', method)]))
+            out.append('# HELP http_requests_total Responses by endpoint and status')
+            out.append('# TYPE http_requests_total counter')
+            for (endpoint, method, status), n in sorted(self.responses.items()):
+                out.append(f'http_requests_total{_labels([("endpoint", endpoint), ("method", method), ("status", status)])} {n}')
+            out.append('# HELP sql_statement_duration_seconds SQL statement latency by statement kind')
+            out.append('# TYPE sql_statement_duration_seconds histogram')
+            for key, hist in sorted(self.statements.items()):
+                out.extend(hist.lines('sql_statement_duration_seconds', [('statement', key)]))
+            out.append('# HELP sql_statements_per_request SQL statements run by one request')
+            out.append('# TYPE sql_statements_per_request histogram')
+            out.extend(self.statements_per_request.lines('sql_statements_per_request', []))
+            out.append('# HELP sql_seconds_per_request Time one request spent in SQL')
+            out.append('# TYPE sql_seconds_per_request histogram')
+            out.extend(self.sql_time_per_request.lines('sql_seconds_per_request', []))
+        seen = set()
+        for name, help_text, value, labels in gauges:
+            if name not in seen:
+                seen.add(name)
+                out.append(f'# HELP {name} {help_text}')
+                out.append(f'# TYPE {name} gauge')
+            out.append(f'{name}{_labels(labels)} {_num(value)}')
+        return '\n'.join(out) + '\n'
+
+
+class TimedCursor:
+    """sqlite3 cursor that reports every execute to a per-request tally"""
+
+    def __init__(self, cursor, tally):
+        self._cursor = cursor
+        self._tally = tally
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            self._cursor.execute(sql, params)
+        finally:
+            self._tally.record(sql, time.perf_counter() - start)
+        return self
+
+    def executemany(self, sql, seq):
+        start = time.perf_counter()
+        try:
+            self._cursor.executemany(sql, seq)
+        finally:
+            self._tally.record(sql, time.perf_counter() - start)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    """Wraps a pooled connection so each statement is counted and timed"""
+
+    def __init__(self, conn, metrics):
+        self.raw = conn
+        self.metrics = metrics
+        self.count = 0
+        self.seconds = 0.0
+
+    def record(self, sql, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.metrics.observe_statement(sql, seconds)
+
+    def cursor(self):
+        return TimedCursor(self.raw.cursor(), self)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class SampledLogger:
+    """Structured (JSON) event log that only keeps a sample of hot-path events"""
+
+    def __init__(self, name, sample_rate=0.01):
+        self.logger = logging.getLogger(name)
+        self.sample_rate = sample_rate
+
+    def event(self, event, sample_rate=None, level=logging.DEBUG, **fields):
+        rate = self.sample_rate if sample_rate is None else sample_rate
+        if rate < 1.0 and random.random() >= rate:
+            return
+        if not self.logger.isEnabledFor(level):
+            return
+        fields['event'] = event
+        if rate < 1.0:
+            fields['sample_rate'] = rate
+        self.logger.log(level, json.dumps(fields, default=str))
@@ -0,0 +1,179 @@
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+CHUNK_SIZE = 64 * 1024
+_WHITESPACE = re.compile(r'\s*')
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+
+
+def iter_json_object(f, chunk_size=CHUNK_SIZE):
+    """Yield the (key, value) pairs of a top-level JSON object, reading f in chunks
+
+    Only one entry is held in memory at a time, so the file can be far
+    larger than RAM.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf, pos = buf[pos:] + chunk, 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    def expect(char):
+        nonlocal pos
+        skip_whitespace()
+        if buf[pos:pos + 1] != char:
+            raise ValueError(f'Expected {char!r} at offset {pos} of the current chunk')
+        pos += 1
+
+    def decode():
+        nonlocal pos
+        skip_whitespace()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            if not eof and _NUMBER_TAIL.match(buf, end).end() == len(buf):
+                fill()  # A number may continue in the next chunk
+                continue
+            pos = end
+            return value
+
+    expect('{')
+    skip_whitespace()
+    if buf[pos:pos + 1] == '}':
+        return
+    while True:
+        key = decode()
+        expect(':')
+        value = decode()
+        yield key, value
+        skip_whitespace()
+        if buf[pos:pos + 1] == ',':
+            pos += 1
+        else:
+            expect('}')
+            return
+
+
+def create_migration_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS migration_state(
+        source TEXT PRIMARY KEY,
+        signature TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        done INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT NOT NULL
+    )
+    ''')
+
+
+def image_reference(path):
+    """URL for a legacy image path, or None if the file is gone"""
+    if not path or not os.path.exists(path.lstrip('/')):
+        return None
+    return '/' + path.replace('\\', '/').lstrip('/')
+
+
+def _profile_row(username, profiles_dir):
+    profile_path = os.path.join(profiles_dir, f'{username}_profile.json')
+    if not os.path.exists(profile_path):
+        return None
+    with open(profile_path, 'r') as pf:
+        profile_data = json.load(pf)
+    return (
+        profile_data.get('name', username),
+        profile_data.get('description', ''),
+        image_reference(profile_data.get('picture')),
+        profile_data.get('background_color', '#f3f4f6'),
+        image_reference(profile_data.get('background_image')),
+        username,
+    )
+
+
+def _write_chunk(conn, source, signature, position, users, profiles):
+    """Insert one chunk and move the checkpoint past it, all in one transaction"""
+    conn.executemany('''
+    INSERT OR IGNORE INTO users (username, email, password_hash, created_at)
+    VALUES (?, ?, ?, ?)
+    ''', users)
+    conn.executemany('''
+    INSERT OR IGNORE INTO profiles (user_id, name, description, picture, background_color, background_image)
+    SELECT user_id, ?, ?, ?, ?, ? FROM users WHERE username = ?
+    ''', profiles)
+    conn.execute('''
+    INSERT OR REPLACE INTO migration_state (source, signature, position, done, updated_at)
+    VALUES (?, ?, ?, 0, ?)
+    ''', (source, signature, position, datetime.now().isoformat()))
+    conn.commit()
+
+
+def migrate_users(conn, source='users.json', profiles_dir='static/profiles', chunk_size=1000):
+    """Import users.json and the per-user profile files, resuming after a crash
+
+    Entries are inserted chunk_size at a time; each chunk commits together
+    with a checkpoint, so a rerun skips what is already in. Inserts ignore
+    rows that exist, which makes replaying a chunk harmless. Images stay
+    where they are and are stored as references.
+    Returns counters including rows per second.
+    """
+    stats = {'users': 0, 'profiles': 0, 'skipped': 0, 'chunks': 0, 'seconds': 0.0, 'rows_per_s': 0.0}
+    if not os.path.exists(source):
+        return stats
+    create_migration_table(conn)
+    st = os.stat(source)
+    signature = f'{st.st_size}:{st.st_mtime_ns}'
+    row = conn.execute('SELECT signature, position, done FROM migration_state WHERE source = ?',
+                       (source,)).fetchone()
+    resume_at = 0
+    if row and row[0] == signature:
+        if row[2]:
+            return stats  # Already imported this exact file
+        resume_at = row[1]
+
+    start = time.perf_counter()
+    users, profiles = [], []
+    position = 0
+    with open(source, 'r', encoding='utf-8') as f:
+        for username, user_data in iter_json_object(f):
+            position += 1
+            if position <= resume_at:
+                stats['skipped'] += 1
+                continue
+            users.append((username, user_data['email'], user_data['password'], user_data['created_at']))
+            profile = _profile_row(username, profiles_dir)
+            if profile:
+                profiles.append(profile)
+            if len(users) >= chunk_size:
+                _write_chunk(conn, source, signature, position, users, profiles)
+                stats['users'] += len(users)
+                stats['profiles'] += len(profiles)
+                stats['chunks'] += 1
+                users, profiles = [], []
+    _write_chunk(conn, source, signature, position, users, profiles)
+    stats['users'] += len(users)
+    stats['profiles'] += len(profiles)
+    stats['chunks'] += 1
+    conn.execute('UPDATE migration_state SET done = 1 WHERE source = ?', (source,))
+    conn.commit()
+    stats['seconds'] = round(time.perf_counter() - start, 3)
+    rows = stats['users'] + stats['profiles']
+    stats['rows_per_s'] = round(rows / stats['seconds'], 1) if stats['seconds'] else float(rows)
+    return stats
@@ -0,0 +1,39 @@
+import struct
+import time
+import zlib
+
+from shared_segment import SharedSegment
+
+# version, modified (unix seconds)
+_SLOT = struct.Struct('<QQ')
+
+
+class ProfileVersions:
+    """Per-user profile version counters shared by every worker through an mmap
+
+    Usernames hash into a fixed number of slots. A write bumps its slot,
+    and a page rendered at an older version is stale in every worker at
+    once, without a query. Two users sharing a slot only cost each other
+    an extra re-render.
+    """
+
+    def __init__(self, path, slots=65536):
+        self.path = path
+        self.slots = slots
+        self.segment = SharedSegment(path, slots * _SLOT.size)
+
+    def _offset(self, username):
+        return zlib.crc32(username.encode('utf-8')) % self.slots * _SLOT.size
+
+    def get(self, username):
+        """Return (version, modified) for a user; a plain memory read"""
+        with self.segment.locked(flock=False) as buf:
+            return _SLOT.unpack_from(buf, self._offset(username))
+
+    def bump(self, username):
+        """Mark a user's profile as changed; returns the new version"""
+        offset = self._offset(username)
+        with self.segment.locked() as buf:
+            version, _ = _SLOT.unpack_from(buf, offset)
+            _SLOT.pack_into(buf, offset, version + 1, int(time.time()))
+        return version + 1
@@ -0,0 +1,76 @@
+import bisect
+import threading
+import time
+
+
+class _Stripe:
+    __slots__ = ('lock', 'buckets', 'allowed', 'throttled')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}  # key -> [tokens, last refill]
+        self.allowed = {}  # endpoint -> count
+        self.throttled = {}  # endpoint -> count
+
+
+class RateLimiter:
+    """Per-user, per-endpoint token buckets kept in process memory
+
+    Buckets are spread over a fixed number of stripes, each with its own
+    lock, so concurrent players rarely contend. budgets maps an endpoint to
+    {min difficulty: (tokens per second, burst)}; a player gets the tier of
+    the highest difficulty they reach. Memory is bounded: when a stripe is
+    full its oldest bucket is dropped, which at worst hands one player a
+    fresh burst.
+    """
+
+    def __init__(self, budgets, stripes=64, max_keys=100000):
+        self.stripes = [_Stripe() for _ in range(stripes)]
+        self.max_per_stripe = max(1, max_keys // stripes)
+        self.configure(budgets)
+
+    def configure(self, budgets):
+        tiers = {}
+        for endpoint, levels in budgets.items():
+            floors = sorted(levels)
+            tiers[endpoint] = (floors, [levels[f] for f in floors])
+        self.tiers = tiers
+
+    def budget(self, endpoint, difficulty):
+        floors, limits = self.tiers[endpoint]
+        index = bisect.bisect_right(floors, difficulty or 0) - 1
+        return limits[max(index, 0)]
+
+    def allow(self, endpoint, user, difficulty=None, cost=1):
+        """Take cost tokens; returns 0 if allowed, else seconds until it would be"""
+        rate, burst = self.budget(endpoint, difficulty)
+        key = (endpoint, user)
+        stripe = self.stripes[hash(key) % len(self.stripes)]
+        now = time.monotonic()
+        with stripe.lock:
+            bucket = stripe.buckets.get(key)
+            if bucket is None:
+                if len(stripe.buckets) >= self.max_per_stripe:
+                    # Oldest key first: dict order is insertion order
+                    stripe.buckets.pop(next(iter(stripe.buckets)))
+                bucket = stripe.buckets[key] = [float(burst), now]
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                stripe.allowed[endpoint] = stripe.allowed.get(endpoint, 0) + 1
+                return 0
+            bucket[0] = tokens
+            stripe.throttled[endpoint] = stripe.throttled.get(endpoint, 0) + 1
+            return (cost - tokens) / rate if cost <= burst else float('inf')
+
+    def stats(self):
+        allowed, throttled, keys = {}, {}, 0
+        for stripe in self.stripes:
+            with stripe.lock:
+                keys += len(stripe.buckets)
+                for endpoint, n in stripe.allowed.items():
+                    allowed[endpoint] = allowed.get(endpoint, 0) + n
+                for endpoint, n in stripe.throttled.items():
+                    throttled[endpoint] = throttled.get(endpoint, 0) + n
+        return {'buckets': keys, 'allowed': allowed, 'throttled': throttled}
@@ -1,5 +1,319 @@
-from flask import redirect
-from app import app
+"""Production entry point: warm workers sharing one listening socket
+
+Usage:
+    python run_server.py                          # 4 prefork workers on 0.0.0.0:5000
+    python run_server.py --workers 8 --port 8000
+    python run_server.py --workers 0              # one threaded process, no master
+    python run_server.py --no-preload             # workers import the app themselves
+    kill -HUP <master pid>                        # replace the workers one at a time
+    kill -TERM <master pid>                       # drain in-flight requests and stop
+
+The master binds the socket, creates the folders and the schema, then
+forks the workers. Each worker primes the world boss, level, lexicon and
+profile caches before it takes a connection, and serves every request
+on its own thread. On SIGHUP a replacement worker is started and only
+once it is warm is an old one told to drain, so capacity never drops.
+With --preload (the default) the app is imported once in the master and
+shared by fork; with --no-preload each worker imports it fresh, so a
+reload also picks up new code.
+"""
+import argparse
+import logging
+import os
+import select
+import signal
+import socket
+import threading
+import time
+import traceback
+
+from metrics import SampledLogger
+
+PROCESS_START = time.perf_counter()
+
+DEFAULT_WORKERS = 4
+BACKLOG = 2048
+# A worker that isn't warm after this long is killed and replaced
+READY_TIMEOUT = 120
+# How long a stopping worker waits for in-flight requests
+GRACEFUL_TIMEOUT = 30
+
+server_log = SampledLogger('worldenderword.server', sample_rate=1.0)
+
+
+def load_app():
+    """Import the app on demand: the master stays small until it needs it"""
+    import app as app_module
+    return app_module
+
+
+def bind(host, port):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(BACKLOG)
+    listener.set_inheritable(True)
+    return listener
+
+
+def millis(seconds):
+    return round(seconds * 1000, 1)
+
+
+class Worker:
+    """Serves the app on an inherited socket until told to stop
+
+    In-flight requests are counted so that a stop lets them finish (up to
+    GRACEFUL_TIMEOUT) while the listening socket is no longer polled.
+    """
+
+    def __init__(self, app_module, listener, host, access_log=False):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        worker = self
+        self.app_module = app_module
+        self.lock = threading.Lock()
+        self.active = 0
+        self.stopping = False
+        self.first_request = None
+
+        class Handler(WSGIRequestHandler):
+            def run_wsgi(self):
+                start = worker.started_request()
+                try:
+                    super().run_wsgi()
+                finally:
+                    if worker.stopping:
+                        self.close_connection = True  # Don't keep idle connections open
+                    worker.finished_request(start)
+
+            def log_request(self, *args, **kwargs):
+                if access_log:
+                    super().log_request(*args, **kwargs)
+
+        self.server = make_server(host, listener.getsockname()[1], app_module.app, threaded=True,
+                                  request_handler=Handler, fd=listener.fileno())
+        # Keep request threads joinable so nothing is cut off mid-response
+        self.server.daemon_threads = False
+
+    def started_request(self):
+        """Returns the start time of this worker's first request, else None"""
+        with self.lock:
+            self.active += 1
+            if self.first_request is None:
+                self.first_request = time.perf_counter()
+                return self.first_request
+        return None
+
+    def finished_request(self, first_start):
+        with self.lock:
+            self.active -= 1
+        if first_start is not None:
+            timings = self.app_module.startup_timings
+            timings['time_to_first_request'] = first_start - self.boot_start
+            timings['first_request'] = time.perf_counter() - first_start
+            server_log.event('first_request', level=logging.INFO, pid=os.getpid(),
+                             time_to_first_request_ms=millis(timings['time_to_first_request']),
+                             first_request_ms=millis(timings['first_request']))
+
+    def warm_up(self, boot_start):
+        self.boot_start = boot_start
+        timings = self.app_module.warm_up()
+        elapsed = time.perf_counter() - boot_start
+        self.app_module.startup_timings['boot'] = elapsed
+        server_log.event('worker_ready', level=logging.INFO, pid=os.getpid(), startup_ms=millis(elapsed),
+                         warm_up_ms=millis(sum(timings.values())))
+
+    def stop(self):
+        """Stop accepting; serve_forever() returns and run() drains"""
+        if self.stopping:
+            return
+        self.stopping = True
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stop())
+        self.server.serve_forever()
+        self.app_module.boss_stream.close()  # Streaming clients reconnect elsewhere
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        while self.active and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.app_module.flush_buffers()
+        server_log.event('worker_stopped', level=logging.INFO, pid=os.getpid(), abandoned=self.active)
+
+
+class Master:
+    """Forks warm workers and keeps the requested number of them running"""
+
+    def __init__(self, args, listener, app_module=None):
+        self.args = args
+        self.listener = listener
+        self.app_module = app_module  # Set when preloaded
+        self.workers = {}  # pid -> read end of its ready pipe
+        self.signals = []
+
+    def setup(self):
+        """Create folders and schema once, before any worker touches them"""
+        if self.app_module is not None:
+            self.app_module.create_app()
+            self.app_module.lexicon()  # Loaded before the fork, its pages are shared by every worker
+            return
+        # Not preloaded: do it in a throwaway child so the master stays app-free
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                load_app().create_app()
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        if os.waitstatus_to_exitcode(status):
+            raise RuntimeError('App setup failed')
+
+    def spawn(self):
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            for fd in self.workers.values():
+                os.close(fd)
+            code = 0
+            try:
+                for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+                    signal.signal(signum, signal.SIG_DFL)
+                boot_start = time.perf_counter()
+                app_module = self.app_module or load_app()
+                worker = Worker(app_module, self.listener, self.args.host, self.args.access_log)
+                worker.warm_up(boot_start)
+                os.write(ready_w, b'1')
+                os.close(ready_w)
+                worker.run()
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            os._exit(code)
+        os.close(ready_w)
+        self.workers[pid] = ready_r
+        return pid
+
+    def wait_ready(self, pid):
+        """True once pid is warm; False if it died or hung while starting"""
+        fd = self.workers.get(pid)
+        if fd is None:
+            return False
+        readable, _, _ = select.select([fd], [], [], READY_TIMEOUT)
+        if readable and os.read(fd, 1) == b'1':
+            return True
+        self.kill(pid, signal.SIGKILL)
+        return False
+
+    def kill(self, pid, signum=signal.SIGTERM):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        """Forget exited workers; returns how many were lost"""
+        lost = 0
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return lost
+            if not pid:
+                return lost
+            fd = self.workers.pop(pid, None)
+            if fd is not None:
+                os.close(fd)
+                lost += 1
+                code = os.waitstatus_to_exitcode(status)
+                if code:
+                    server_log.event('worker_exited', level=logging.WARNING, pid=pid, code=code)
+
+    def reload(self):
+        """Replace every worker, starting each replacement before retiring an old one"""
+        start = time.perf_counter()
+        if self.app_module is None:
+            self.setup()  # New code may bring schema changes
+        for old in list(self.workers):
+            new = self.spawn()
+            if not self.wait_ready(new):
+                server_log.event('reload_aborted', level=logging.ERROR, pid=new)
+                return
+            self.kill(old)
+        server_log.event('reloaded', level=logging.INFO, workers=self.args.workers,
+                         reload_ms=millis(time.perf_counter() - start))
+
+    def stop(self):
+        for pid in list(self.workers):
+            self.kill(pid)
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT + 5
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            self.kill(pid, signal.SIGKILL)
+        self.reap()
+
+    def run(self):
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda signum, frame: self.signals.append(signum))
+        self.setup()
+        pids = [self.spawn() for _ in range(self.args.workers)]
+        ready = sum(self.wait_ready(pid) for pid in pids)
+        server_log.event('server_ready', level=logging.INFO, pid=os.getpid(), workers=ready,
+                         address=f'{self.args.host}:{self.args.port}',
+                         startup_ms=millis(time.perf_counter() - PROCESS_START))
+        while True:
+            while self.signals:
+                signum = self.signals.pop(0)
+                if signum == signal.SIGHUP:
+                    self.reload()
+                else:
+                    self.stop()
+                    return
+            self.reap()
+            missing = self.args.workers - len(self.workers)
+            for _ in range(missing):
+                self.wait_ready(self.spawn())  # One at a time: don't stampede the database
+            time.sleep(0.5)
+
+
+def serve_single(args, listener):
+    """--workers 0: warm up and serve in this process"""
+    app_module = load_app()
+    app_module.create_app()
+    worker = Worker(app_module, listener, args.host, args.access_log)
+    worker.warm_up(PROCESS_START)
+    server_log.event('server_ready', level=logging.INFO, pid=os.getpid(), workers=0,
+                     address=f'{args.host}:{args.port}',
+                     startup_ms=millis(time.perf_counter() - PROCESS_START))
+    worker.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WORKERS', DEFAULT_WORKERS)),
+                        help='prefork worker processes; 0 serves from this process')
+    parser.add_argument('--no-preload', dest='preload', action='store_false',
+                        help='import the app in each worker instead of once in the master')
+    parser.add_argument('--access-log', action='store_true', help='log every request')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(process)d %(name)s %(message)s')
+
+    listener = bind(args.host, args.port)
+    if args.workers <= 0:
+        serve_single(args, listener)
+        return
+    Master(args, listener, load_app() if args.preload else None).run()
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
+    main()
@@ -0,0 +1,103 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def estimate_size(obj):
+    """Rough memory footprint of a game object and its attribute values"""
+    size = sys.getsizeof(obj)
+    for name in getattr(type(obj), '__slots__', ()):
+        size += sys.getsizeof(getattr(obj, name, None))
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+        size += sum(sys.getsizeof(v) for v in obj.__dict__.values())
+    return size
+
+
+class SessionStore:
+    """Dict-like per-player game state with idle expiry and LRU eviction
+
+    Entries are kept in least-recently-used order, so expired sessions are
+    always at the front and each write only has to look there.
+    """
+
+    def __init__(self, max_size=10000, idle_ttl=1800.0):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.data = OrderedDict()  # key -> [last_seen, value]
+        self.lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+    def _prune(self, now):
+        while self.data:
+            key, entry = next(iter(self.data.items()))
+            if now - entry[0] >= self.idle_ttl:
+                self.expired += 1
+            elif len(self.data) > self.max_size:
+                self.evicted += 1
+            else:
+                break
+            del self.data[key]
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return default
+            if now - entry[0] >= self.idle_ttl:
+                del self.data[key]
+                self.expired += 1
+                return default
+            entry[0] = now
+            self.data.move_to_end(key)
+            return entry[1]
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        now = time.monotonic()
+        with self.lock:
+            self.data[key] = [now, value]
+            self.data.move_to_end(key)
+            self._prune(now)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __delitem__(self, key):
+        with self.lock:
+            del self.data[key]
+
+    def pop(self, key, default=None):
+        with self.lock:
+            entry = self.data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def __len__(self):
+        with self.lock:
+            return len(self.data)
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            self._prune(now)
+            values = [entry[1] for entry in self.data.values()]
+            stats = {
+                'live': len(values),
+                'max_size': self.max_size,
+                'idle_ttl': self.idle_ttl,
+                'expired': self.expired,
+                'evicted': self.evicted,
+            }
+        stats['memory_bytes'] = sys.getsizeof(self.data) + sum(estimate_size(v) for v in values)
+        return stats
+
@@ -0,0 +1,50 @@
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to a single-process lock
+    fcntl = None
+
+
+class SharedSegment:
+    """A fixed-size file-backed mmap shared by every worker process
+
+    Threads of one process are serialized with a lock and processes with
+    flock on the file. The file is created and zero-filled on first use.
+    """
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.lock = threading.Lock()
+        self.pid = None
+        self.fd = None
+        self.buf = None
+
+    def _open(self):
+        # flock only excludes separate open file descriptions, so every
+        # (forked) worker needs its own descriptor and mapping
+        if self.pid == os.getpid():
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(fd).st_size < self.size:
+            os.ftruncate(fd, self.size)
+        self.fd = fd
+        self.buf = mmap.mmap(fd, self.size)
+        self.pid = os.getpid()
+
+    @contextmanager
+    def locked(self, exclusive=True, flock=True):
+        """Yield the mapped buffer; flock=False only excludes this process's threads"""
+        with self.lock:
+            self._open()
+            if flock and fcntl:
+                fcntl.flock(self.fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield self.buf
+            finally:
+                if flock and fcntl:
+                    fcntl.flock(self.fd, fcntl.LOCK_UN)
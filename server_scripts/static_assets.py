@@ -0,0 +1,160 @@
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional: gzip copies are always built
+    brotli = None
+
+# Files under static/ that get fingerprinted copies
+ASSET_PATTERNS = ('js/*.js', '*.css', '*.json', 'sprites/*.png', '*.png')
+# Worth precompressing; images are compressed already
+COMPRESSIBLE = ('.js', '.css', '.json', '.svg', '.html')
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+MANIFEST = 'manifest.json'
+
+
+def fingerprint(name, data):
+    """<stem>.<first 12 hex digits of sha256><ext>"""
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def _write(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build(static_dir, out_dir, patterns=ASSET_PATTERNS):
+    """Copy static files under content-hashed names, with .gz/.br siblings
+
+    Outputs that already exist are left alone, so rebuilding unchanged
+    assets is a hash per file. Older hashed copies are kept for pages that
+    still reference them; see prune(). Returns the manifest.
+    """
+    files, encodings = {}, {}
+    for pattern in patterns:
+        for source in sorted(glob.glob(os.path.join(static_dir, pattern))):
+            name = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            if name in files:
+                continue
+            with open(source, 'rb') as f:
+                data = f.read()
+            hashed = fingerprint(name, data)
+            dest = os.path.join(out_dir, hashed)
+            files[name] = hashed
+            if not os.path.exists(dest):
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                _write(dest, data)
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            available = []
+            for encoding, suffix in ENCODINGS:
+                if encoding == 'br' and brotli is None:
+                    continue
+                if not os.path.exists(dest + suffix):
+                    if encoding == 'br':
+                        packed = brotli.compress(data, quality=11)
+                    else:
+                        packed = gzip.compress(data, compresslevel=9, mtime=0)
+                    if len(packed) >= len(data):
+                        continue
+                    _write(dest + suffix, packed)
+                available.append(encoding)
+            if available:
+                encodings[hashed] = available
+    manifest = {'files': files, 'encodings': encodings}
+    os.makedirs(out_dir, exist_ok=True)
+    data = json.dumps(manifest, indent=2, sort_keys=True).encode()
+    path = os.path.join(out_dir, MANIFEST)
+    try:
+        with open(path, 'rb') as f:
+            unchanged = f.read() == data
+    except OSError:
+        unchanged = False
+    if not unchanged:  # Keep its mtime, which pages use as a Last-Modified
+        _write(path, data)
+    return manifest
+
+
+def prune(out_dir):
+    """Delete built files the current manifest no longer references; returns how many"""
+    manifest = AssetManifest(out_dir)
+    keep = {os.path.join(out_dir, MANIFEST)}
+    for hashed in manifest.hashed:
+        path = os.path.join(out_dir, hashed)
+        keep.add(path)
+        keep.update(path + suffix for _, suffix in ENCODINGS)
+    removed = 0
+    for root, _, names in os.walk(out_dir):
+        for filename in names:
+            path = os.path.join(root, filename)
+            if path not in keep:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+class AssetManifest:
+    """Maps static file names to their fingerprinted copies in out_dir
+
+    digest and modified identify the build, for validators of pages that
+    link to the hashed names.
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        path = os.path.join(out_dir, MANIFEST)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            manifest = json.loads(data)
+            self.modified = int(os.path.getmtime(path))
+        except (OSError, ValueError):
+            data = b''
+            manifest = {'files': {}, 'encodings': {}}  # Not built: plain /static URLs
+            self.modified = 0
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        self.files = manifest['files']
+        self.encodings = manifest['encodings']
+        self.hashed = set(self.files.values())
+
+    def hashed_name(self, filename):
+        return self.files.get(filename)
+
+    def path(self, hashed, encoding=None):
+        """Filesystem path of a built file, or None if the name is not in the manifest"""
+        if hashed not in self.hashed:
+            return None
+        path = os.path.join(self.out_dir, hashed)
+        if encoding:
+            path += dict(ENCODINGS)[encoding]
+        return path
+
+    def negotiate(self, hashed, accept_encodings):
+        """Best precompressed encoding the client accepts, or None for the raw file"""
+        for encoding in self.encodings.get(hashed, ()):
+            if accept_encodings[encoding]:
+                return encoding
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fingerprint and precompress the static assets')
+    parser.add_argument('--static', default=os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static')))
+    parser.add_argument('--out', help='output folder (default: <static>/dist)')
+    parser.add_argument('--prune', action='store_true', help='remove outputs of earlier builds')
+    args = parser.parse_args()
+    out_dir = args.out or os.path.join(args.static, 'dist')
+    manifest = build(args.static, out_dir)
+    for name, hashed in sorted(manifest['files'].items()):
+        print(f"{name} -> {hashed} {' '.join(manifest['encodings'].get(hashed, []))}")
+    if args.prune:
+        print(f'Removed {prune(out_dir)} stale files')
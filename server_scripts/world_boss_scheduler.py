@@ -0,0 +1,141 @@
+import threading
+from datetime import datetime, timedelta
+
+from background import BackgroundLoop
+
+WORLD_BOSS_COLUMNS = 'boss_id, name, health, max_health, level_model, key_word, created_at'
+
+
+def world_boss_health(num_players):
+    """Boss HP for a player base, rounded to a multiple of 50"""
+    num_players = num_players or 1
+    base = 200 * num_players
+    scaling = base * ((num_players + 100) / 100)
+    raw_hp = base + scaling
+    raw_hp *= (1 + (num_players / 100.0))  # Scale by number of players
+    return int(round(raw_hp / 50.0) * 50)
+
+
+class WorldBossScheduler:
+    """Keeps the next world boss ready and swaps it in when the current one ends
+
+    The successor waits in world_boss with status 'pending'. swap() archives
+    the active boss into world_boss_archive and activates the successor in
+    one transaction, so the killing blow costs a few indexed statements and
+    never a count or a generation. A background thread per worker prepares
+    the next successor and retires bosses whose timer ran out or that are
+    dead but still active, e.g. because the killing blow's swap failed;
+    the transactions make sure only one worker acts on each boss.
+    """
+
+    def __init__(self, connect, spawn, on_swap, snapshot=None, lifetime=24 * 3600, interval=5.0):
+        self.connect = connect  # () -> context manager yielding a connection
+        self.spawn = spawn  # conn -> (name, health, level_model, key_word)
+        self.on_swap = on_swap  # (old_id, new_id, health, outcome), after commit
+        self.snapshot = snapshot  # () -> (boss_id, health, defeated) shared by the workers
+        self.lifetime = lifetime
+        self.lock = threading.Lock()
+        # A failed tick is usually the write lock timing out under load, or
+        # the schema being migrated; the dead or expired boss is still there
+        # on the next tick, which simply tries again
+        self.loop = BackgroundLoop('world_boss_scheduler', self._tick, interval)
+        self.prepared = 0
+        self.swaps = {}  # outcome -> count
+
+    def _insert(self, conn, status, now):
+        name, health, level_model, key_word = self.spawn(conn)
+        expires_at = (now + timedelta(seconds=self.lifetime)).isoformat() if status == 'active' else None
+        return conn.execute('''
+            INSERT INTO world_boss (name, health, max_health, level_model, key_word, created_at, status, expires_at)
+            SELECT ?, ?, ?, ?, ?, ?, ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM world_boss WHERE status = ?)
+        ''', (name, health, health, level_model, key_word, now.isoformat(), status, expires_at, status))
+
+    def prepare(self, conn):
+        """Generate the successor unless one is already waiting"""
+        if conn.execute("SELECT 1 FROM world_boss WHERE status = 'pending'").fetchone():
+            return False
+        cursor = self._insert(conn, 'pending', datetime.now())
+        conn.commit()
+        if cursor.rowcount:
+            with self.lock:
+                self.prepared += 1
+        return bool(cursor.rowcount)
+
+    def swap(self, conn, boss_id, outcome):
+        """Archive boss_id and activate its successor; None if another worker already did
+
+        With boss_id None this only installs a boss when none is active.
+        The connection must not have a transaction open: the swap is its own.
+        """
+        if conn.in_transaction:
+            raise RuntimeError('swap() needs a connection with no open transaction')
+        now = datetime.now()
+        conn.execute('BEGIN IMMEDIATE')  # Take the write lock before looking
+        try:
+            active = conn.execute("SELECT boss_id FROM world_boss WHERE status = 'active'").fetchone()
+            if boss_id is None and active is None:
+                pass  # First boss, or the database lost its active row
+            elif active is None or active[0] != boss_id:
+                conn.rollback()
+                return None
+            else:
+                conn.execute(f'''
+                    INSERT OR REPLACE INTO world_boss_archive ({WORLD_BOSS_COLUMNS}, ended_at, outcome)
+                    SELECT {WORLD_BOSS_COLUMNS}, ?, ? FROM world_boss WHERE boss_id = ?
+                ''', (now.isoformat(), outcome, boss_id))
+                conn.execute('DELETE FROM world_boss WHERE boss_id = ?', (boss_id,))
+            successor = conn.execute(
+                "SELECT boss_id FROM world_boss WHERE status = 'pending' ORDER BY boss_id LIMIT 1").fetchone()
+            if successor:
+                conn.execute('''
+                    UPDATE world_boss SET status = 'active', created_at = ?, expires_at = ?
+                    WHERE boss_id = ?
+                ''', (now.isoformat(), (now + timedelta(seconds=self.lifetime)).isoformat(), successor[0]))
+            else:
+                self._insert(conn, 'active', now)  # Nothing prepared yet: roll one now
+            new_id, health = conn.execute(
+                "SELECT boss_id, health FROM world_boss WHERE status = 'active'").fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        with self.lock:
+            self.swaps[outcome] = self.swaps.get(outcome, 0) + 1
+        self.on_swap(boss_id, new_id, health, outcome)
+        self.start()
+        self.loop.wake()  # Prepare the next successor now rather than at the next tick
+        return new_id, health
+
+    def _dead(self, boss_id, health):
+        """True if the active boss is at 0 HP in its row or in the shared state"""
+        if health <= 0:
+            return True
+        if self.snapshot is None:
+            return False
+        shared_id, shared_health, defeated = self.snapshot()
+        return shared_id == boss_id and (defeated or shared_health <= 0)
+
+    def tick(self, conn):
+        """One round of background work: retire a dead or expired boss, keep a successor ready"""
+        active = conn.execute(
+            "SELECT boss_id, health, expires_at FROM world_boss WHERE status = 'active'").fetchone()
+        if active:
+            boss_id, health, expires_at = active
+            if self._dead(boss_id, health):
+                self.swap(conn, boss_id, 'defeated')
+            elif expires_at is not None and expires_at <= datetime.now().isoformat():
+                self.swap(conn, boss_id, 'expired')
+        self.prepare(conn)
+
+    def _tick(self):
+        with self.connect() as conn:
+            self.tick(conn)
+
+    def start(self):
+        """Start this worker's background thread if it isn't running"""
+        self.loop.start()
+
+    def stats(self):
+        with self.lock:
+            return {'prepared': self.prepared, 'errors': self.loop.errors, 'swaps': dict(self.swaps)}
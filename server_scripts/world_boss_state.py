@@ -0,0 +1,63 @@
+import struct
+
+from shared_segment import SharedSegment
+
+# boss_id, health, defeated
+_LAYOUT = struct.Struct('<qqq')
+
+
+class SharedWorldBoss:
+    """World boss HP shared by every worker process through a file-backed mmap
+
+    The world_boss table stays the durable record; this segment is what the
+    workers agree on between two flushes. Reads are plain memory reads and
+    writes are serialized with flock, so no DB round-trip is needed to know
+    the current HP or to decide who landed the killing blow.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.segment = SharedSegment(path, _LAYOUT.size)
+
+    def _read(self, buf):
+        boss_id, health, defeated = _LAYOUT.unpack_from(buf)
+        return boss_id, health, bool(defeated)
+
+    def snapshot(self):
+        """Return (boss_id, health, defeated) as seen by all workers"""
+        with self.segment.locked(exclusive=False) as buf:
+            return self._read(buf)
+
+    def publish(self, boss_id, health, force=False):
+        """Install a boss loaded from the DB, never moving back to an older one
+
+        Returns False when the segment already holds a newer boss.
+        """
+        with self.segment.locked() as buf:
+            cur_id, cur_health, defeated = self._read(buf)
+            if boss_id == cur_id and not force:
+                # Same boss: HP only goes down, keep the lowest value seen
+                health = min(health, cur_health)
+            elif boss_id < cur_id and not force:
+                return False
+            else:
+                defeated = False
+            _LAYOUT.pack_into(buf, 0, boss_id, health, defeated)
+            return True
+
+    def hit(self, boss_id, damage):
+        """Apply damage to boss_id and return (health, killed, dealt)
+
+        killed is True for exactly one caller across all workers. dealt is
+        the HP actually removed. Hits aimed at a boss that has already been
+        replaced are dropped.
+        """
+        with self.segment.locked() as buf:
+            cur_id, health, defeated = self._read(buf)
+            if cur_id != boss_id:
+                return health, False, 0
+            dealt = min(max(damage, 0), health)
+            health -= dealt
+            killed = health <= 0 and not defeated
+            _LAYOUT.pack_into(buf, 0, cur_id, health, defeated or killed)
+            return health, killed, dealt
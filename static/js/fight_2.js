@@ -64,7 +64,7 @@ async function fetchDifficulty() {
 }
 
 async function fetchKeywords() {
-    const response = await fetch('/static/words.json');
+    const response = await fetch(assetUrl('words.json'));
     keywordsData = await response.json();
 }
 
@@ -162,11 +162,27 @@ async function handleKeywordClick(group, word) {
     }
 }
 
+// World boss HP is pushed by the server instead of being polled
+function subscribeWorldBoss() {
+    if (fightType !== 'world_boss' || !window.EventSource) return;
+    const stream = new EventSource('/api/boss/stream');
+    const onUpdate = (e) => {
+        const data = JSON.parse(e.data);
+        bossHealth = data.health;
+        updateBossBar();
+    };
+    stream.addEventListener('hp', onUpdate);
+    stream.addEventListener('defeated', onUpdate);
+    // A new boss means a new key word: fetch it once
+    stream.addEventListener('respawn', () => fetchBoss());
+}
+
 let boss = { key_word: {} };
 
 async function initGameBoss() {
     await fetchKeywords();
     await fetchBoss();
+    subscribeWorldBoss();
     await fetchDifficulty();
     displayKeywords();
     setInterval(() => {
@@ -290,8 +306,8 @@ function loadSprite(src) {
 }
 
 async function preloadSprites() {
-    knifeSprite = await loadSprite('/static/sprites/knife.png');
-    redKnifeSprite = await loadSprite('/static/sprites/red_knife.png');
+    knifeSprite = await loadSprite(assetUrl('sprites/knife.png'));
+    redKnifeSprite = await loadSprite(assetUrl('sprites/red_knife.png'));
 }
 
 preloadSprites();
@@ -402,11 +418,27 @@ function updateweapon() {
 // Initialize intervals with default difficulty
 setIntervals(player.getDifficulty());
 
+// Collisions are queued and sent as one batch per frame window
+const COMBAT_FLUSH_MS = 100;
+let pendingCombatEvents = [];
+let combatFlushTimer = null;
+
 function sendDamageToServer(amount) {
-    fetch('/api/player/hp', {
+    pendingCombatEvents.push({type: 'player_damage', damage: amount, t: Date.now()});
+    if (!combatFlushTimer) {
+        combatFlushTimer = setTimeout(flushCombatEvents, COMBAT_FLUSH_MS);
+    }
+}
+
+function flushCombatEvents() {
+    combatFlushTimer = null;
+    const events = pendingCombatEvents;
+    pendingCombatEvents = [];
+    if (events.length === 0) return;
+    fetch(`/api/combat/events?fight=${fightType}`, {
         method: 'POST',
         headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({damage: amount})
+        body: JSON.stringify({events: events})
     }).then(res => res.json()).then(data => {
         // Update HP bar only from server response
         updateHPBar(data.hp);
@@ -0,0 +1,60 @@
+"""Several worker processes hitting one shared world boss segment"""
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server_scripts')))
+
+from world_boss_state import SharedWorldBoss
+
+WORKERS = 8
+HITS = 50
+
+
+def worker(path, boss_id, damage, results):
+    boss = SharedWorldBoss(path)
+    killed = dealt = 0
+    for _ in range(HITS):
+        _, k, d = boss.hit(boss_id, damage)
+        killed += k
+        dealt += d
+    results.put((killed, dealt))
+
+
+def hit_from_workers(path, boss_id, damage):
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(path, boss_id, damage, results)) for _ in range(WORKERS)]
+    for p in procs:
+        p.start()
+    totals = [results.get(timeout=30) for _ in procs]
+    for p in procs:
+        p.join(timeout=30)
+        assert p.exitcode == 0
+    return sum(k for k, _ in totals), sum(d for _, d in totals)
+
+
+def test_exactly_one_kill(tmp_path):
+    path = str(tmp_path / 'boss.shm')
+    SharedWorldBoss(path).publish(1, 1000)
+    killed, dealt = hit_from_workers(path, 1, 3)  # 1200 damage against 1000 HP
+    assert killed == 1
+    assert dealt == 1000
+    assert SharedWorldBoss(path).snapshot() == (1, 0, True)
+
+
+def test_damage_adds_up(tmp_path):
+    path = str(tmp_path / 'boss.shm')
+    SharedWorldBoss(path).publish(1, 5000)
+    killed, dealt = hit_from_workers(path, 1, 7)
+    assert killed == 0
+    assert dealt == WORKERS * HITS * 7
+    assert SharedWorldBoss(path).snapshot() == (1, 5000 - WORKERS * HITS * 7, False)
+
+
+def test_hits_on_a_replaced_boss_are_dropped(tmp_path):
+    path = str(tmp_path / 'boss.shm')
+    SharedWorldBoss(path).publish(2, 1000)
+    killed, dealt = hit_from_workers(path, 1, 3)
+    assert (killed, dealt) == (0, 0)
+    assert SharedWorldBoss(path).snapshot() == (2, 1000, False)